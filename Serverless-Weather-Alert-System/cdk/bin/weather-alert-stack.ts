@@ -31,6 +31,10 @@ const computeStack = new WeatherAlertComputeStack(app, 'WeatherAlertComputeStack
   env,
   description: 'Compute layer for serverless weather alert system',
   mumTable: dataStack.mumTable,
+  locationIndexTable: dataStack.locationIndexTable,
+  locationIndexerDLQ: dataStack.locationIndexerDLQ,
+  cacheTable: dataStack.cacheTable,
+  providerStateTable: dataStack.providerStateTable,
   locationFetchQueue: dataStack.locationFetchQueue,
   weatherResultQueue: dataStack.weatherResultQueue,
   adviceRequestQueue: dataStack.adviceRequestQueue,
@@ -56,6 +60,7 @@ const monitoringStack = new WeatherAlertMonitoringStack(app, 'WeatherAlertMonito
   locationFetchQueue: dataStack.locationFetchQueue,
   weatherResultQueue: dataStack.weatherResultQueue,
   notifyQueue: dataStack.notifyQueue,
+  locationIndexerDLQ: dataStack.locationIndexerDLQ,
 });
 
 // Add dependencies
@@ -8,12 +8,16 @@ import * as targets from 'aws-cdk-lib/aws-events-targets';
 import * as iam from 'aws-cdk-lib/aws-iam';
 import * as logs from 'aws-cdk-lib/aws-logs';
 import * as secretsmanager from 'aws-cdk-lib/aws-secretsmanager';
-import { SqsEventSource } from 'aws-cdk-lib/aws-lambda-event-sources';
+import { DynamoEventSource, SqsDlq, SqsEventSource } from 'aws-cdk-lib/aws-lambda-event-sources';
 import { Construct } from 'constructs';
 import { NagSuppressions } from 'cdk-nag';
 
 interface ComputeStackProps extends cdk.StackProps {
   mumTable: dynamodb.ITable;
+  locationIndexTable: dynamodb.ITable;
+  locationIndexerDLQ: sqs.Queue;
+  cacheTable: dynamodb.ITable;
+  providerStateTable: dynamodb.ITable;
   locationFetchQueue: sqs.Queue;
   weatherResultQueue: sqs.Queue;
   adviceRequestQueue: sqs.Queue;
@@ -23,6 +27,7 @@ interface ComputeStackProps extends cdk.StackProps {
 
 export class WeatherAlertComputeStack extends cdk.Stack {
   public readonly profilesToLocationsFn: lambda.Function;
+  public readonly locationIndexerFn: lambda.Function;
   public readonly weatherFetchFn: lambda.Function;
   public readonly adviceFn: lambda.Function;
   public readonly sendAdviceSMSFn: lambda.Function;
@@ -44,6 +49,39 @@ export class WeatherAlertComputeStack extends cdk.Stack {
     //   'weather-alert-system/sms-credentials'
     // );
 
+    // Shared Python helpers (SQS batch publishing, etc.) available under /opt/python
+    const sharedLayer = new lambda.LayerVersion(this, 'SharedLayer', {
+      layerVersionName: 'WeatherAlert-Shared',
+      description: 'Shared Python helpers for weather alert Lambda functions',
+      code: lambda.Code.fromAsset('../lambda/shared'),
+      compatibleRuntimes: [lambda.Runtime.PYTHON_3_14],
+    });
+
+    // Weather provider for WeatherFetchFn: 'tomorrow.io', 'open-meteo' (many locations
+    // per request) or 'gridded' (forecast grid files)
+    const weatherProvider: string = 'tomorrow.io';
+
+    // numpy is only needed by the gridded provider, so it ships as a layer added only
+    // then. Wheels are always the Lambda (manylinux x86_64) build, whatever the build host.
+    const weatherFetchLayers = [sharedLayer];
+    if (weatherProvider === 'gridded') {
+      weatherFetchLayers.push(new lambda.LayerVersion(this, 'NumpyLayer', {
+        layerVersionName: 'WeatherAlert-Numpy',
+        description: 'numpy for the gridded weather provider',
+        code: lambda.Code.fromAsset('../lambda/numpy-layer', {
+          bundling: {
+            image: lambda.Runtime.PYTHON_3_14.bundlingImage,
+            command: [
+              'bash', '-c',
+              'pip install -r requirements.txt -t /asset-output/python ' +
+              '--platform manylinux2014_x86_64 --only-binary=:all:',
+            ],
+          },
+        }),
+        compatibleRuntimes: [lambda.Runtime.PYTHON_3_14],
+      }));
+    }
+
     // Common Lambda configuration
     const commonLambdaProps = {
       runtime: lambda.Runtime.PYTHON_3_14,
@@ -51,12 +89,26 @@ export class WeatherAlertComputeStack extends cdk.Stack {
       memorySize: 512,
       logRetention: logs.RetentionDays.ONE_WEEK,
       tracing: lambda.Tracing.ACTIVE,
+      layers: [sharedLayer],
       environment: {
         POWERTOOLS_SERVICE_NAME: 'weather-alert-system',
         LOG_LEVEL: 'INFO',
       },
     };
 
+    // Partitions of the sparse AlertEligibleIndex GSI (scanner and indexer must agree)
+    const alertShards = '8';
+
+    // Partitions of the sparse CellRowIndex GSI of LocationCellIndex (scanner and indexer must agree)
+    const cellShards = '4';
+
+    // Spatial bucketing for location dedup (scanner and indexer must agree)
+    // round | geohash | grid | hex, with a strategy-specific resolution
+    const locationBucketing = {
+      LOCATION_BUCKETING: 'round',
+      LOCATION_RESOLUTION: '3',
+    };
+
     // 1. RecipientsToLocationsFn - Scans DDB and queues locations
     this.profilesToLocationsFn = new lambda.Function(this, 'RecipientsToLocationsFn', {
       ...commonLambdaProps,
@@ -69,13 +121,42 @@ export class WeatherAlertComputeStack extends cdk.Stack {
         RECIPIENTS_TABLE_NAME: props.mumTable.tableName,
         MUM_TABLE_NAME: props.mumTable.tableName, // Backward compatibility
         LOCATION_QUEUE_URL: props.locationFetchQueue.queueUrl,
+        SCAN_SEGMENTS: '4', // Parallel DynamoDB scan segments
+        SCAN_PROJECTION: 'full', // 'minimal' reads only keys/coordinates; profiles loaded on alert
+        LOCATION_SOURCE: 'scan', // 'eligible' queries AlertEligibleIndex, 'index' reads LocationCellIndex
+        LOCATION_INDEX_TABLE_NAME: props.locationIndexTable.tableName,
+        ALERT_SHARDS: alertShards,
+        CELL_SHARDS: cellShards,
+        ...locationBucketing,
+        CHECKPOINT_BUCKET: props.dataBucket.bucketName, // Resumable scans
+        CHECKPOINT_PREFIX: 'checkpoints/recipients-to-locations/',
       },
     });
 
     // Grant permissions
     props.mumTable.grantReadData(this.profilesToLocationsFn);
+    props.locationIndexTable.grantReadData(this.profilesToLocationsFn);
     props.locationFetchQueue.grantSendMessages(this.profilesToLocationsFn);
 
+    // Scan checkpoints, and re-invoking itself to continue a checkpointed scan
+    // (ARN built from the function name to avoid a circular dependency)
+    this.profilesToLocationsFn.addToRolePolicy(
+      new iam.PolicyStatement({
+        effect: iam.Effect.ALLOW,
+        actions: ['s3:GetObject', 's3:PutObject'],
+        resources: [props.dataBucket.arnForObjects('checkpoints/recipients-to-locations/*')],
+      })
+    );
+    this.profilesToLocationsFn.addToRolePolicy(
+      new iam.PolicyStatement({
+        effect: iam.Effect.ALLOW,
+        actions: ['lambda:InvokeFunction'],
+        resources: [
+          `arn:aws:lambda:${this.region}:${this.account}:function:WeatherAlert-RecipientsToLocations`,
+        ],
+      })
+    );
+
     // EventBridge rule to trigger daily at 6 AM UTC (9 AM EAT)
     const dailyRule = new events.Rule(this, 'DailyWeatherCheckRule', {
       ruleName: 'WeatherAlert-DailyWeatherCheck',
@@ -88,31 +169,94 @@ export class WeatherAlertComputeStack extends cdk.Stack {
     });
     dailyRule.addTarget(new targets.LambdaFunction(this.profilesToLocationsFn));
 
+    // 1b. LocationIndexerFn - Keeps LocationCellIndex and AlertEligibleIndex keys up to date
+    // from the MumBaseTable stream
+    this.locationIndexerFn = new lambda.Function(this, 'LocationIndexerFn', {
+      ...commonLambdaProps,
+      functionName: 'WeatherAlert-LocationIndexer',
+      description: 'Maintains the location and alert eligibility indexes from recipient profile changes',
+      code: lambda.Code.fromAsset('../lambda/location-indexer'),
+      handler: 'index.lambda_handler',
+      timeout: cdk.Duration.seconds(60),
+      environment: {
+        ...commonLambdaProps.environment,
+        LOCATION_INDEX_TABLE_NAME: props.locationIndexTable.tableName,
+        RECIPIENTS_TABLE_NAME: props.mumTable.tableName,
+        ALERT_SHARDS: alertShards,
+        CELL_SHARDS: cellShards,
+        ...locationBucketing,
+      },
+    });
+
+    props.locationIndexTable.grantReadWriteData(this.locationIndexerFn);
+    props.mumTable.grantWriteData(this.locationIndexerFn); // alertShard/nextAlertDate
+
+    this.locationIndexerFn.addEventSource(
+      new DynamoEventSource(props.mumTable, {
+        startingPosition: lambda.StartingPosition.TRIM_HORIZON,
+        batchSize: 100,
+        maxBatchingWindow: cdk.Duration.seconds(5),
+        bisectBatchOnError: true,
+        retryAttempts: 5,
+        reportBatchItemFailures: true,
+        onFailure: new SqsDlq(props.locationIndexerDLQ), // Records still failing after the retries
+      })
+    );
+
     // 2. WeatherFetchFn - Fetches weather from Tomorrow.io
     this.weatherFetchFn = new lambda.Function(this, 'WeatherFetchFn', {
       ...commonLambdaProps,
       functionName: 'WeatherAlert-WeatherFetch',
       description: 'Fetches weather forecasts from Tomorrow.io API',
       code: lambda.Code.fromAsset('../lambda/weather-fetch'),
+      layers: weatherFetchLayers,
       handler: 'index.lambda_handler',
       timeout: cdk.Duration.seconds(300),
-      reservedConcurrentExecutions: 1, // Rate limit API calls (Tomorrow.io free tier: 500/day)
+      reservedConcurrentExecutions: 4, // API calls are limited by the shared token bucket, not by concurrency
       environment: {
         ...commonLambdaProps.environment,
         WEATHER_RESULT_QUEUE_URL: props.weatherResultQueue.queueUrl,
+        RECIPIENTS_TABLE_NAME: props.mumTable.tableName,
+        LOCATION_INDEX_TABLE_NAME: props.locationIndexTable.tableName, // Members of alerting index-built locations
         TEMP_THRESHOLD_C: '32',
+        // ALERT_RULES: '{"default": "temperatureMax >= 32", "ANC": "temperatureMax >= 30"}', // Compound/per-segment rules
+        // HOURLY_RULE: 'temperature >= 32', HOURLY_WINDOW: '12:00-16:00', ALERT_TIMEZONE: 'Africa/Nairobi', // Hourly window alerts
+        DEMO_MODE: 'true', // Set to 'false' to only alert when the rules match
+        WEATHER_PROVIDER: weatherProvider,
+        GRID_FORECAST_PATH: `s3://${props.dataBucket.bucketName}/forecast-grid/`, // Used by the 'gridded' provider
+        SLIM_FORECAST: 'true', // Request only the fields the alert rules use, for today only
+        FETCH_CONCURRENCY: '4', // Parallel forecast requests per invocation
+        MAX_CALLS_PER_SECOND: '3', // Tomorrow.io free tier: 3 requests/second
+        MAX_CALLS_PER_DAY: '500', // Tomorrow.io free tier: 500 requests/day
+        RATE_LIMIT_TABLE_NAME: props.providerStateTable.tableName, // Shares the limits and circuit breaker across containers
+        PROVIDER_TIMEOUT_SECONDS: '5', // Per request; timeouts, 429s and 5xx are retried with backoff
+        CIRCUIT_FAILURE_THRESHOLD: '5', // Consecutive failures before calls stop
+        CIRCUIT_OPEN_SECONDS: '30', // First pause; doubles while the provider keeps failing
+        CACHE_TABLE_NAME: props.cacheTable.tableName,
+        FORECAST_CACHE_TTL_SECONDS: '21600', // Reuse a location's forecast for 6 hours
         TOMORROW_IO_API_KEY: tomorrowIoSecret.secretValue.unsafeUnwrap(),
       },
     });
 
     // Grant permissions
     props.weatherResultQueue.grantSendMessages(this.weatherFetchFn);
+    props.mumTable.grantReadData(this.weatherFetchFn); // Load profiles for index-built messages
+    props.locationIndexTable.grantReadData(this.weatherFetchFn); // Members of index-built locations
+    props.cacheTable.grantReadWriteData(this.weatherFetchFn); // Shared forecast cache
+    props.providerStateTable.grantReadWriteData(this.weatherFetchFn); // Shared rate limits and circuit breaker
     tomorrowIoSecret.grantRead(this.weatherFetchFn);
+    this.weatherFetchFn.addToRolePolicy(
+      new iam.PolicyStatement({
+        effect: iam.Effect.ALLOW,
+        actions: ['s3:GetObject'],
+        resources: [props.dataBucket.arnForObjects('forecast-grid/*')],
+      })
+    );
 
     // SQS trigger from LocationFetch queue
     this.weatherFetchFn.addEventSource(
       new SqsEventSource(props.locationFetchQueue, {
-        batchSize: 10,
+        batchSize: 50, // Locations are fetched in parallel; failed records are retried individually
         maxBatchingWindow: cdk.Duration.seconds(5),
         reportBatchItemFailures: true,
       })
@@ -134,6 +278,19 @@ export class WeatherAlertComputeStack extends cdk.Stack {
         BEDROCK_KNOWLEDGE_BASE_ID: cdk.Fn.importValue('WeatherAlertBedrockKBId'),
         BEDROCK_MODEL_ID: 'anthropic.claude-3-sonnet-20240229-v1:0',
         BEDROCK_SYSTEM_PROMPT: 'You are a maternal health advisor providing supportive, actionable health advice to pregnant and postpartum mothers based on weather forecasts.',
+        GENERATION_CONCURRENCY: '4', // Parallel Bedrock generations per invocation
+        BEDROCK_TIMEOUT_SECONDS: '30', // Per call; throttling is retried with adaptive backoff
+        STREAM_ADVICE: 'true', // Stream the completion and stop at the SMS budget
+        SMS_MAX_SEGMENTS: '2', // Advice budget: 2 concatenated SMS segments (306 GSM-7 or 134 UCS-2 characters)
+        COHORT_MODE: 'true', // One generated message per cohort (status, conditions, temperature band, language)
+        COHORT_TEMP_BAND_C: '2',
+        CACHE_TABLE_NAME: props.cacheTable.tableName,
+        ADVICE_CACHE_TTL_SECONDS: '86400', // Reuse a completion of an identical prompt for a day
+        KB_CACHE_VERSION: '1', // Bump after each Knowledge Base sync to drop cached retrievals
+        KB_CACHE_WARMUP: 'true', // Retrieve every query permutation on a container's first invocation
+        KB_WARMUP_BUDGET_SECONDS: '5', // Stop starting warmup retrievals after this long
+        // Medical conditions to warm queries for; must match recipients' medical_conditions values exactly (case included)
+        KB_WARMUP_CONDITIONS: 'none,hypertension',
       },
     });
 
@@ -162,11 +319,12 @@ export class WeatherAlertComputeStack extends cdk.Stack {
     );
 
     props.notifyQueue.grantSendMessages(this.adviceFn);
+    props.cacheTable.grantReadWriteData(this.adviceFn); // Shared advice cache
 
     // SQS trigger from WeatherResult queue
     this.adviceFn.addEventSource(
       new SqsEventSource(props.weatherResultQueue, {
-        batchSize: 5,
+        batchSize: 20, // Larger batches share more cohorts
         maxBatchingWindow: cdk.Duration.seconds(10),
         reportBatchItemFailures: true,
       })
@@ -235,6 +393,7 @@ export class WeatherAlertComputeStack extends cdk.Stack {
     // ============================================
     const lambdaFunctions = [
       this.profilesToLocationsFn,
+      this.locationIndexerFn,
       this.weatherFetchFn,
       this.adviceFn,
       this.sendAdviceSMSFn,
@@ -270,6 +429,8 @@ export class WeatherAlertComputeStack extends cdk.Stack {
               'Action::logs:PutLogEvents',
               `Resource::arn:aws:bedrock:${this.region}:${this.account}:knowledge-base/*`,
               'Resource::<MumBaseTableF15CC75C.Arn>/index/*',
+              { regex: '/^Resource::.*\\/checkpoints\\/.*\\*$/g' },
+              { regex: '/^Resource::.*\\/forecast-grid\\/\\*$/g' },
             ],
           },
         ]
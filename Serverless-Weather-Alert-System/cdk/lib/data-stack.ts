@@ -8,6 +8,10 @@ import { NagSuppressions } from 'cdk-nag';
 
 export class WeatherAlertDataStack extends cdk.Stack {
   public readonly mumTable: dynamodb.Table;
+  public readonly locationIndexTable: dynamodb.Table;
+  public readonly locationIndexerDLQ: sqs.Queue;
+  public readonly cacheTable: dynamodb.Table;
+  public readonly providerStateTable: dynamodb.Table;
   public readonly dataBucket: s3.Bucket;
   public readonly locationFetchQueue: sqs.Queue;
   public readonly locationFetchDLQ: sqs.Queue;
@@ -47,6 +51,99 @@ export class WeatherAlertDataStack extends cdk.Stack {
       projectionType: dynamodb.ProjectionType.ALL,
     });
 
+    // Sparse GSI of recipients eligible for an alert, queried by the daily run
+    // alertShard/nextAlertDate are only set on profiles with a valid location
+    // (maintained by LocationIndexerFn), so the index holds nothing else
+    this.mumTable.addGlobalSecondaryIndex({
+      indexName: 'AlertEligibleIndex',
+      partitionKey: {
+        name: 'alertShard',
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: 'nextAlertDate',
+        type: dynamodb.AttributeType.STRING,
+      },
+      projectionType: dynamodb.ProjectionType.INCLUDE,
+      nonKeyAttributes: [
+        'latitude',
+        'longitude',
+        'lastAlertedDate',
+        'language',
+        'anc_pnc_value',
+        'medical_conditions',
+        'status',
+        'facility_code',
+        'facility_name',
+        'phone_number',
+      ],
+    });
+
+    // Location index: one partition per rounded location, holding a "#cell" row
+    // (lookup point and recipient count) and one row per member recipient
+    // Maintained from the MumBaseTable stream by LocationIndexerFn
+    this.locationIndexTable = new dynamodb.Table(this, 'LocationIndexTable', {
+      tableName: 'LocationCellIndex',
+      partitionKey: {
+        name: 'cell',
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: 'contact_uuid',
+        type: dynamodb.AttributeType.STRING,
+      },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      encryption: dynamodb.TableEncryption.AWS_MANAGED,
+      pointInTimeRecovery: true,
+      removalPolicy: cdk.RemovalPolicy.DESTROY, // Rebuildable from MumBaseTable
+    });
+
+    // Sparse GSI of the "#cell" rows only (cellShard is set on no member row), so
+    // the daily run reads one row per location instead of one per recipient
+    this.locationIndexTable.addGlobalSecondaryIndex({
+      indexName: 'CellRowIndex',
+      partitionKey: {
+        name: 'cellShard',
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: 'cell',
+        type: dynamodb.AttributeType.STRING,
+      },
+      projectionType: dynamodb.ProjectionType.INCLUDE,
+      nonKeyAttributes: ['latitude', 'longitude', 'recipient_count'],
+    });
+
+    // Shared cache (forecasts etc.), keyed by "<namespace>#<key>"
+    // Items expire through DynamoDB TTL on expires_at
+    this.cacheTable = new dynamodb.Table(this, 'CacheTable', {
+      tableName: 'WeatherAlertCache',
+      partitionKey: {
+        name: 'cache_key',
+        type: dynamodb.AttributeType.STRING,
+      },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      encryption: dynamodb.TableEncryption.AWS_MANAGED,
+      pointInTimeRecovery: true,
+      timeToLiveAttribute: 'expires_at',
+      removalPolicy: cdk.RemovalPolicy.DESTROY, // Cache contents are disposable
+    });
+
+    // Shared state for calls to external providers (rate-limit token buckets,
+    // daily quota counters), updated with conditional writes by every container
+    this.providerStateTable = new dynamodb.Table(this, 'ProviderStateTable', {
+      tableName: 'WeatherAlertProviderState',
+      partitionKey: {
+        name: 'state_key',
+        type: dynamodb.AttributeType.STRING,
+      },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      encryption: dynamodb.TableEncryption.AWS_MANAGED,
+      pointInTimeRecovery: true,
+      timeToLiveAttribute: 'expires_at',
+      removalPolicy: cdk.RemovalPolicy.DESTROY, // Short-lived state only
+    });
+
     // S3 Bucket for initial data uploads and backups
     this.dataBucket = new s3.Bucket(this, 'WeatherAlertDataBucket', {
       bucketName: `weather-alert-data-${this.account}`,
@@ -80,6 +177,15 @@ export class WeatherAlertDataStack extends cdk.Stack {
       ]
     );
 
+    // Dead Letter Queue for MumBaseTable stream batches LocationIndexerFn could not apply
+    // (stream position metadata; rerun the backfill to repair the index)
+    this.locationIndexerDLQ = new sqs.Queue(this, 'LocationIndexerDLQ', {
+      queueName: 'LocationIndexerDLQ',
+      encryption: sqs.QueueEncryption.SQS_MANAGED,
+      retentionPeriod: cdk.Duration.days(14),
+      enforceSSL: true, // CDK Nag: Enforce SSL
+    });
+
     // Dead Letter Queue for LocationFetch
     this.locationFetchDLQ = new sqs.Queue(this, 'LocationFetchDLQ', {
       queueName: 'LocationFetchDLQ',
@@ -97,7 +203,7 @@ export class WeatherAlertDataStack extends cdk.Stack {
       enforceSSL: true, // CDK Nag: Enforce SSL
       deadLetterQueue: {
         queue: this.locationFetchDLQ,
-        maxReceiveCount: 3,
+        maxReceiveCount: 10, // Records returned while the provider circuit is open are retried, not dead-lettered
       },
     });
 
@@ -170,6 +276,21 @@ export class WeatherAlertDataStack extends cdk.Stack {
       description: 'DynamoDB table for maternal profiles',
     });
 
+    new cdk.CfnOutput(this, 'LocationIndexTableName', {
+      value: this.locationIndexTable.tableName,
+      description: 'DynamoDB table indexing recipients by location',
+    });
+
+    new cdk.CfnOutput(this, 'CacheTableName', {
+      value: this.cacheTable.tableName,
+      description: 'DynamoDB table caching forecasts',
+    });
+
+    new cdk.CfnOutput(this, 'ProviderStateTableName', {
+      value: this.providerStateTable.tableName,
+      description: 'DynamoDB table holding shared provider rate limits',
+    });
+
     new cdk.CfnOutput(this, 'DataBucketName', {
       value: this.dataBucket.bucketName,
       description: 'S3 bucket for data uploads',
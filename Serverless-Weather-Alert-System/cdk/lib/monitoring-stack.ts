@@ -17,6 +17,7 @@ interface MonitoringStackProps extends cdk.StackProps {
   locationFetchQueue: sqs.Queue;
   weatherResultQueue: sqs.Queue;
   notifyQueue: sqs.Queue;
+  locationIndexerDLQ?: sqs.Queue;
 }
 
 export class WeatherAlertMonitoringStack extends cdk.Stack {
@@ -130,6 +131,22 @@ export class WeatherAlertMonitoringStack extends cdk.Stack {
       );
     });
 
+    // Stream batches the location indexer gave up on: the index has drifted
+    if (props.locationIndexerDLQ) {
+      const indexerDlqAlarm = new cloudwatch.Alarm(this, 'LocationIndexerDLQAlarm', {
+        alarmName: 'WeatherAlert-LocationIndexer-FailedRecords',
+        metric: props.locationIndexerDLQ.metricApproximateNumberOfMessagesVisible({
+          statistic: 'Maximum',
+          period: cdk.Duration.minutes(5),
+        }),
+        threshold: 0,
+        evaluationPeriods: 1,
+        comparisonOperator: cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+        treatMissingData: cloudwatch.TreatMissingData.NOT_BREACHING,
+      });
+      indexerDlqAlarm.addAlarmAction(new actions.SnsAction(alarmTopic));
+    }
+
     // Custom metrics widget for end-to-end flow
     dashboard.addWidgets(
       new cloudwatch.GraphWidget({
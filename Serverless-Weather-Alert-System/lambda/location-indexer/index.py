@@ -0,0 +1,229 @@
+import os
+import zlib
+import datetime
+import boto3
+from botocore.exceptions import ClientError
+from locations import location_cell, cell_key, cell_center
+
+# Environment variables set by CDK
+dynamodb = boto3.resource("dynamodb")
+dynamodb_client = boto3.client("dynamodb")
+LOCATION_INDEX_TABLE_NAME = os.environ["LOCATION_INDEX_TABLE_NAME"]
+recipients_table = dynamodb.Table(os.environ.get("RECIPIENTS_TABLE_NAME", os.environ.get("MUM_TABLE_NAME")))
+
+# Partitions of the sparse AlertEligibleIndex GSI (must match RecipientsToLocationsFn)
+ALERT_SHARDS = int(os.environ.get("ALERT_SHARDS", 8))
+
+# Partitions of the sparse CellRowIndex GSI of "#cell" rows (must match RecipientsToLocationsFn)
+CELL_SHARDS = int(os.environ.get("CELL_SHARDS", 4))
+
+# nextAlertDate for recipients who have never been alerted
+NEVER_ALERTED = "1970-01-01"
+
+# Each cell is one partition of the index table: a summary row (this sort key)
+# with the cell's lookup point and recipient_count, plus one row per member
+# keyed by contact_uuid, so a cell's size is not bound by the item size limit.
+# Only summary rows carry cellShard, so the daily run reads just those through
+# the sparse CellRowIndex GSI
+CELL_ROW = "#cell"
+
+def attr_float(image, name):
+    """Read a numeric attribute from a DynamoDB stream image (wire format)."""
+    value = image.get(name)
+    if not value:
+        return None
+    try:
+        return float(value.get("N", value.get("S")))
+    except (TypeError, ValueError):
+        return None
+
+def image_cell(image):
+    """Return (cell key, lookup lat, lookup lon) for a stream image, or None if it has no valid location."""
+    if not image:
+        return None
+    lat = attr_float(image, "latitude")
+    lon = attr_float(image, "longitude")
+    if lat is None or lon is None or (lat == 0.0 and lon == 0.0):
+        return None
+    cell = location_cell(lat, lon)
+    return (cell_key(cell), *cell_center(cell))
+
+def cell_shard(cell):
+    return str(zlib.crc32(cell.encode("utf-8")) % CELL_SHARDS)
+
+def index_key(cell, member):
+    return {"cell": {"S": cell}, "contact_uuid": {"S": member}}
+
+def write_membership(member_write, count_update):
+    """
+    Writes a member row and its cell's count in one transaction.
+    Returns False if the member row's condition failed (nothing was written).
+    """
+    try:
+        dynamodb_client.transact_write_items(TransactItems=[member_write, count_update])
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "TransactionCanceledException":
+            raise
+        reasons = e.response.get("CancellationReasons") or []
+        if reasons and reasons[0].get("Code") == "ConditionalCheckFailed":
+            return False
+        raise
+
+def add_to_cell(cell, lat, lon, contact_uuid):
+    """Add a recipient to a cell. Idempotent: a recipient already in the cell is not re-counted."""
+    write_membership(
+        {"Put": {
+            "TableName": LOCATION_INDEX_TABLE_NAME,
+            "Item": index_key(cell, contact_uuid),
+            "ConditionExpression": "attribute_not_exists(contact_uuid)",
+        }},
+        {"Update": {
+            "TableName": LOCATION_INDEX_TABLE_NAME,
+            "Key": index_key(cell, CELL_ROW),
+            "UpdateExpression": (
+                "ADD recipient_count :one "
+                "SET latitude = if_not_exists(latitude, :lat), "
+                "longitude = if_not_exists(longitude, :lon), "
+                "cellShard = if_not_exists(cellShard, :shard)"
+            ),
+            "ExpressionAttributeValues": {
+                ":one": {"N": "1"},
+                ":lat": {"N": str(lat)},
+                ":lon": {"N": str(lon)},
+                ":shard": {"S": cell_shard(cell)},
+            },
+        }},
+    )
+
+def remove_from_cell(cell, contact_uuid):
+    """Remove a recipient from a cell, deleting the cell once it is empty."""
+    removed = write_membership(
+        {"Delete": {
+            "TableName": LOCATION_INDEX_TABLE_NAME,
+            "Key": index_key(cell, contact_uuid),
+            "ConditionExpression": "attribute_exists(contact_uuid)",
+        }},
+        {"Update": {
+            "TableName": LOCATION_INDEX_TABLE_NAME,
+            "Key": index_key(cell, CELL_ROW),
+            "UpdateExpression": "ADD recipient_count :minus_one",
+            "ExpressionAttributeValues": {":minus_one": {"N": "-1"}},
+        }},
+    )
+    if not removed:
+        return
+    try:
+        dynamodb_client.delete_item(
+            TableName=LOCATION_INDEX_TABLE_NAME,
+            Key=index_key(cell, CELL_ROW),
+            ConditionExpression="recipient_count <= :zero",
+            ExpressionAttributeValues={":zero": {"N": "0"}},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+def attr_str(image, name):
+    """Read a string attribute from a DynamoDB stream image (wire format)."""
+    return (image.get(name) or {}).get("S")
+
+def eligibility_keys(image, contact_uuid):
+    """
+    Returns the (alertShard, nextAlertDate) keys a profile should have in the sparse
+    AlertEligibleIndex, or None if it has no valid location and should stay out of it.
+    """
+    if image_cell(image) is None:
+        return None
+
+    shard = str(zlib.crc32(contact_uuid.encode("utf-8")) % ALERT_SHARDS)
+    try:
+        last_alerted = datetime.date.fromisoformat(attr_str(image, "lastAlertedDate"))
+        next_alert = (last_alerted + datetime.timedelta(days=1)).isoformat()
+    except (TypeError, ValueError):
+        next_alert = NEVER_ALERTED
+    return shard, next_alert
+
+def sync_eligibility(image, contact_uuid):
+    """
+    Keeps alertShard/nextAlertDate on the profile in line with lastAlertedDate.
+    The write only happens when they differ, so the stream record it produces is a no-op.
+    """
+    wanted = eligibility_keys(image, contact_uuid)
+    current = (attr_str(image, "alertShard"), attr_str(image, "nextAlertDate"))
+    if wanted == current or (wanted is None and current == (None, None)):
+        return
+
+    last_alerted = attr_str(image, "lastAlertedDate")
+    if last_alerted is None:
+        condition = "attribute_exists(contact_uuid) AND attribute_not_exists(lastAlertedDate)"
+        values = {}
+    else:
+        # Skip if lastAlertedDate changed again; its own stream record will sync it
+        condition = "attribute_exists(contact_uuid) AND lastAlertedDate = :last"
+        values = {":last": last_alerted}
+
+    if wanted is None:
+        update = "REMOVE alertShard, nextAlertDate"
+    else:
+        update = "SET alertShard = :shard, nextAlertDate = :next"
+        values.update({":shard": wanted[0], ":next": wanted[1]})
+
+    kwargs = {
+        "Key": {"contact_uuid": contact_uuid},
+        "UpdateExpression": update,
+        "ConditionExpression": condition,
+    }
+    if values:
+        kwargs["ExpressionAttributeValues"] = values
+
+    try:
+        recipients_table.update_item(**kwargs)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+def process_record(record):
+    """Apply one MumBaseTable stream record to the location index."""
+    change = record["dynamodb"]
+    contact_uuid = change["Keys"]["contact_uuid"]["S"]
+    if change.get("NewImage"):
+        sync_eligibility(change["NewImage"], contact_uuid)
+
+    old = image_cell(change.get("OldImage"))
+    new = image_cell(change.get("NewImage"))
+
+    old_cell = old[0] if old else None
+    new_cell = new[0] if new else None
+    if old_cell == new_cell:
+        return False
+
+    if old_cell:
+        remove_from_cell(old_cell, contact_uuid)
+    if new_cell:
+        add_to_cell(new_cell, new[1], new[2], contact_uuid)
+    return True
+
+def lambda_handler(event, context):
+    """
+    Keeps the location index table (location bucket -> member rows and count)
+    up to date from the MumBaseTable DynamoDB stream.
+    """
+    records = event.get("Records", [])
+    moved = 0
+
+    for record in records:
+        try:
+            if process_record(record):
+                moved += 1
+        except Exception as e:
+            # Stream records must be applied in order: retry from the first failure
+            print(f"[LocationIndexerFn] Failed to index record: {e}")
+            return {
+                "batchItemFailures": [
+                    {"itemIdentifier": record["dynamodb"]["SequenceNumber"]}
+                ]
+            }
+
+    print(f"[LocationIndexerFn] Processed {len(records)} stream records ({moved} location changes)")
+    return {"batchItemFailures": []}
@@ -1,11 +1,51 @@
 import os
 import json
+import math
+import time
+import hashlib
+import itertools
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, ReadTimeoutError
+from concurrent.futures import ThreadPoolExecutor
+from sqs_batch import SqsBatchPublisher
+from cache import TieredCache
+from metrics import emit_metrics
+
+# Cohorts of a batch are generated in parallel, up to GENERATION_CONCURRENCY at once.
+# Bedrock calls time out after BEDROCK_TIMEOUT_SECONDS and throttling is retried
+# up to BEDROCK_MAX_ATTEMPTS times with botocore's adaptive mode, which also slows
+# the client's own request rate. Records whose advice still fails are returned
+# as batchItemFailures and redelivered.
+GENERATION_CONCURRENCY = int(os.environ.get('GENERATION_CONCURRENCY', 4))
+BEDROCK_TIMEOUT_SECONDS = int(os.environ.get('BEDROCK_TIMEOUT_SECONDS', 30))
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get('BEDROCK_MAX_ATTEMPTS', 4))
+
+bedrock_config = Config(
+    connect_timeout=5,
+    read_timeout=BEDROCK_TIMEOUT_SECONDS,
+    retries={"max_attempts": BEDROCK_MAX_ATTEMPTS, "mode": "adaptive"},
+    max_pool_connections=max(GENERATION_CONCURRENCY, 10),
+)
 
 # AWS clients
 sqs = boto3.client('sqs')
-bedrock = boto3.client('bedrock-runtime')
-bedrock_kb = boto3.client('bedrock-agent-runtime')
+dynamodb_client = boto3.client('dynamodb')
+bedrock = boto3.client('bedrock-runtime', config=bedrock_config)
+bedrock_kb = boto3.client('bedrock-agent-runtime', config=bedrock_config)
+
+# Bedrock errors worth redelivering the record for, rather than sending the fallback text
+RETRYABLE_ERRORS = {
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "InternalServerException",
+    "ModelStreamErrorException",
+}
+
+class BedrockUnavailable(Exception):
+    """Raised when Bedrock is throttling or unreachable after the client's retries."""
 
 # Environment variables set by CDK
 NOTIFY_QUEUE_URL = os.environ["NOTIFY_QUEUE_URL"]
@@ -18,6 +58,80 @@ SYSTEM_PROMPT = os.environ.get(
     "You are a weather advisory assistant providing personalized recommendations based on weather forecasts."
 )
 
+# Cohort mode: recipients with the same maternal status, medical conditions,
+# temperature band (COHORT_TEMP_BAND_C wide, e.g. 32-34°C) and language share one
+# generated message. The prompt asks for a {temperature} placeholder, filled in
+# per recipient, so Bedrock calls scale with distinct cohorts, not recipients.
+# Band edges are multiples of the width, so they line up with the 28/32°C
+# thresholds in build_query when the width divides 4.
+COHORT_MODE = os.environ.get('COHORT_MODE', 'false').lower() == 'true'
+COHORT_TEMP_BAND_C = float(os.environ.get('COHORT_TEMP_BAND_C', 2))
+TEMPERATURE_PLACEHOLDER = "{temperature}"
+
+# Advice cache: completions keyed by a hash of the model ID and the final prompt,
+# in-process LRU plus the shared DynamoDB cache table, so a redelivered message
+# or a repeated cohort reuses the stored completion instead of calling Claude
+CACHE_TABLE_NAME = os.environ.get('CACHE_TABLE_NAME')
+ADVICE_CACHE_TTL_SECONDS = int(os.environ.get('ADVICE_CACHE_TTL_SECONDS', 86400))
+ADVICE_CACHE_MAX_ENTRIES = int(os.environ.get('ADVICE_CACHE_MAX_ENTRIES', 512))
+
+# Streaming: with STREAM_ADVICE on, advice is read from invoke_model_with_response_stream
+# and the stream is closed once the SMS budget is reached: SMS_MAX_SEGMENTS
+# concatenated SMS segments, or ADVICE_MAX_CHARS when set. A segment holds 160
+# GSM-7 characters (153 each for more than one), but any character outside
+# GSM-7 (°, emoji, curly quotes) switches the whole SMS to UCS-2 at 70 (67).
+# The prompt asks for plain GSM-7 text, and each recipient's final message
+# (after the temperature is filled in) is cut back to the last full sentence
+# that fits the budget for its encoding. Time to first token and total latency
+# are logged and published per generation.
+STREAM_ADVICE = os.environ.get('STREAM_ADVICE', 'false').lower() == 'true'
+SMS_MAX_SEGMENTS = int(os.environ.get('SMS_MAX_SEGMENTS', 2))
+ADVICE_MAX_CHARS = int(os.environ.get('ADVICE_MAX_CHARS', 0)) or None
+
+# GSM 03.38 default alphabet; extension characters take two septets
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENSION = set("^{}\\[~]|€\f")
+
+# (time to first token, total) in ms for each streamed generation of the current invocation
+stream_timings = []
+
+FALLBACK_ADVICE = "Unable to generate personalized message at this time. Please check back later."
+
+advice_cache = TieredCache(
+    "advice",
+    dynamodb_client=dynamodb_client,
+    table_name=CACHE_TABLE_NAME,
+    ttl_seconds=ADVICE_CACHE_TTL_SECONDS,
+    max_entries=ADVICE_CACHE_MAX_ENTRIES,
+)
+
+# KB retrieval cache: build_query yields only a few distinct queries, so their
+# snippets are cached per knowledge base and KB_CACHE_VERSION (bump it, e.g. to
+# the ingestion job ID, after each KB sync) and each search runs once per sync.
+# KB_CACHE_WARMUP retrieves every query permutation on a container's first
+# invocation (not during init, which is limited to 10 s), for at most
+# KB_WARMUP_BUDGET_SECONDS, using the medical conditions listed in
+# KB_WARMUP_CONDITIONS. build_query uses the condition verbatim, so these must
+# match the recipients' medical_conditions values exactly, including case.
+KB_CACHE_VERSION = os.environ.get('KB_CACHE_VERSION', '1')
+KB_CACHE_TTL_SECONDS = int(os.environ.get('KB_CACHE_TTL_SECONDS', 604800))
+KB_CACHE_MAX_ENTRIES = int(os.environ.get('KB_CACHE_MAX_ENTRIES', 256))
+KB_CACHE_WARMUP = os.environ.get('KB_CACHE_WARMUP', 'false').lower() == 'true'
+KB_WARMUP_CONDITIONS = [c.strip() for c in os.environ.get('KB_WARMUP_CONDITIONS', 'none').split(',') if c.strip()]
+KB_WARMUP_BUDGET_SECONDS = float(os.environ.get('KB_WARMUP_BUDGET_SECONDS', 5))
+kb_cache_warmed = False
+
+kb_cache = TieredCache(
+    f"kb#{KB_ID}#{KB_CACHE_VERSION}",
+    dynamodb_client=dynamodb_client,
+    table_name=CACHE_TABLE_NAME,
+    ttl_seconds=KB_CACHE_TTL_SECONDS,
+    max_entries=KB_CACHE_MAX_ENTRIES,
+)
+
 def build_query(anc_pnc, med_conds, temperatureMax):
     """Build search query for Bedrock Knowledge Base."""
     keywords = []
@@ -44,7 +158,22 @@ def build_query(anc_pnc, med_conds, temperatureMax):
     return " ".join(keywords)
 
 def call_bedrock_kb_retrieve(query, kb_id):
-    """Search Bedrock KB and return top retrieved snippets as context."""
+    """
+    Search Bedrock KB and return top retrieved snippets as context, from the
+    retrieval cache when the query was seen since the last KB sync.
+    """
+    cached = kb_cache.get(query)
+    if cached is not None:
+        return cached
+
+    snippets = retrieve_snippets(query, kb_id)
+    if snippets is None:
+        return ""
+    kb_cache.put(query, snippets)
+    return snippets
+
+def retrieve_snippets(query, kb_id):
+    """Top KB snippets for a query; None if the retrieval failed."""
     try:
         response = bedrock_kb.retrieve(
             knowledgeBaseId=kb_id,
@@ -65,18 +194,56 @@ def call_bedrock_kb_retrieve(query, kb_id):
         return "\n".join(summaries)
     except Exception as e:
         print(f"[MessageGeneratorFn] KB retrieval error: {e}")
-        return ""
+        return None
 
-def build_sms_prompt(context_snippets, anc_pnc, med_conds, temperatureMax, is_swahili):
-    """Build prompt for Claude to generate SMS advice."""
+def warm_kb_cache(budget_seconds):
+    """
+    Retrieves every query build_query can produce for the warmup conditions, skipping cached ones.
+    No retrieval is started after budget_seconds; queries left over are retrieved when first needed.
+    """
+    # One temperature per build_query heat band, and each maternal status
+    queries = {
+        build_query(anc_pnc, med_conds, temp)
+        for temp, anc_pnc, med_conds in itertools.product((32, 28, None), ("ANC", "PNC", None), KB_WARMUP_CONDITIONS)
+    }
+    deadline = time.monotonic() + budget_seconds
+
+    def warm(query):
+        if time.monotonic() >= deadline:
+            return False
+        call_bedrock_kb_retrieve(query, KB_ID)
+        return True
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        warmed = sum(pool.map(warm, queries))
+    print(f"[MessageGeneratorFn] KB cache warmed with {warmed} of {len(queries)} queries: {kb_cache.stats()}")
+
+def build_sms_prompt(context_snippets, anc_pnc, med_conds, temperatureMax, is_swahili, template=False):
+    """
+    Build prompt for Claude to generate SMS advice.
+    With template=True the message is shared by a cohort, and temperatureMax is its band.
+    """
     prompt = (
         "You are drafting a weather-related health alert for a mother in Kenya.\n"
         f"User details: maternal status: {anc_pnc}; medical conditions: {med_conds}; "
         f"forecasted max temperature: {temperatureMax}°C.\n\n"
         f"Relevant health advice snippets:\n{context_snippets}\n\n"
         "Write a supportive and actionable SMS using clear everyday language for Kenyan mothers. "
-        "Keep it concise (under 300 words) and include specific actions they should take."
     )
+    if STREAM_ADVICE:
+        prompt += (
+            f"Keep it under {sms_budget('')} characters and include specific actions they should take. "
+            "Use only plain letters, digits and basic punctuation: no emoji, no curly quotes, "
+            "and write temperatures like 32C rather than with a degree sign."
+        )
+    else:
+        prompt += "Keep it concise (under 300 words) and include specific actions they should take."
+
+    if template:
+        prompt += (
+            f" Whenever you mention the forecast temperature, write exactly {TEMPERATURE_PLACEHOLDER}"
+            " instead of a number."
+        )
     
     if is_swahili:
         prompt += " Respond in Swahili."
@@ -85,9 +252,35 @@ def build_sms_prompt(context_snippets, anc_pnc, med_conds, temperatureMax, is_sw
     
     return prompt
 
+def advice_cache_key(prompt, model_id):
+    """Content address of a completion: SHA-256 of the model ID and prompt."""
+    return hashlib.sha256(f"{model_id}\n{prompt}".encode("utf-8")).hexdigest()
+
 def call_bedrock_claude(prompt, model_id):
-    """Call Claude via Bedrock to generate advice."""
+    """
+    Call Claude via Bedrock to generate advice, reusing a cached completion of the
+    same prompt when there is one. The fallback message is never cached.
+    """
+    key = advice_cache_key(prompt, model_id)
+    cached = advice_cache.get(key)
+    if cached is not None:
+        return cached
+
+    advice = invoke_claude(prompt, model_id)
+    if advice:
+        advice_cache.put(key, advice)
+        return advice
+    return FALLBACK_ADVICE
+
+def invoke_claude(prompt, model_id):
+    """
+    Generate advice with Claude; returns None if the call failed.
+    Raises BedrockUnavailable when throttled or timed out, so the record is retried.
+    """
     try:
+        if STREAM_ADVICE:
+            return stream_claude(prompt, model_id)
+
         response = bedrock.invoke_model(
             modelId=model_id,
             body=json.dumps({
@@ -105,9 +298,102 @@ def call_bedrock_claude(prompt, model_id):
             return result["content"][0].get("text", "").strip()
         
         return result.get('completion', '').strip() or result.get('output', '').strip()
+    except ClientError as e:
+        # Errors inside a response stream use camelCase codes (throttlingException)
+        code = e.response["Error"]["Code"]
+        if code[:1].upper() + code[1:] in RETRYABLE_ERRORS:
+            raise BedrockUnavailable(str(e))
+        print(f"[MessageGeneratorFn] Bedrock Claude error: {e}")
+        return None
+    except (BotocoreConnectionError, ReadTimeoutError) as e:
+        # Connect and read timeouts
+        raise BedrockUnavailable(str(e))
     except Exception as e:
         print(f"[MessageGeneratorFn] Bedrock Claude error: {e}")
-        return f"Unable to generate personalized message at this time. Please check back later."
+        return None
+
+def stream_claude(prompt, model_id):
+    """Stream advice from Claude, stopping once a GSM-7 SMS budget of characters has arrived."""
+    start = time.monotonic()
+    first_token = None
+    text = ""
+    closed_early = False
+    max_chars = sms_budget('')
+    response = bedrock.invoke_model_with_response_stream(
+        modelId=model_id,
+        body=json.dumps({
+            "messages": [{"role": "user", "content": prompt}],
+            # Roughly 2+ characters per token, so the budget is reached before max_tokens
+            "max_tokens": min(500, max_chars // 2 + 20),
+            "anthropic_version": "bedrock-2023-05-31"
+        }),
+        accept='application/json',
+        contentType='application/json'
+    )
+    stream = response['body']
+    try:
+        for event in stream:
+            chunk = json.loads(event.get("chunk", {}).get("bytes", b"{}"))
+            if chunk.get("type") != "content_block_delta":
+                continue
+            if first_token is None:
+                first_token = time.monotonic()
+            text += chunk["delta"].get("text", "")
+            if len(text) >= max_chars:
+                closed_early = True
+                break
+    finally:
+        # Closing early stops reading (and paying for) the rest of the completion
+        stream.close()
+
+    total_ms = (time.monotonic() - start) * 1000
+    ttft_ms = ((first_token or time.monotonic()) - start) * 1000
+    stream_timings.append((ttft_ms, total_ms))
+    print(
+        f"[MessageGeneratorFn] Streamed {len(text)} chars: "
+        f"first token {ttft_ms:.0f} ms, total {total_ms:.0f} ms"
+    )
+    if closed_early:
+        # The last sentence was cut off mid-stream; filling in the temperature can
+        # shorten the text below the budget, so fit_sms alone would keep the fragment
+        return trim_to_sentence(text[:max_chars])
+    # Cut to the SMS budget per recipient, once the temperature is filled in
+    return text.strip()
+
+def is_gsm7(text):
+    """True when text can be sent in the GSM-7 alphabet (otherwise it goes as UCS-2)."""
+    return all(c in GSM7_BASIC or c in GSM7_EXTENSION for c in text)
+
+def sms_budget(text):
+    """Characters that fit in SMS_MAX_SEGMENTS segments in the encoding text needs, or ADVICE_MAX_CHARS."""
+    if ADVICE_MAX_CHARS:
+        return ADVICE_MAX_CHARS
+    single, multi = (160, 153) if is_gsm7(text) else (70, 67)
+    return single if SMS_MAX_SEGMENTS <= 1 else multi * SMS_MAX_SEGMENTS
+
+def fit_sms(text):
+    """Cuts a final message to the SMS budget for its encoding."""
+    budget = sms_budget(text)
+    if is_gsm7(text):
+        # GSM-7 extension characters take two septets
+        budget -= sum(1 for c in text if c in GSM7_EXTENSION)
+    return truncate_sms(text, budget)
+
+def truncate_sms(text, max_chars):
+    """Cuts text to max_chars at the last full sentence, or word, that fits."""
+    if len(text) <= max_chars:
+        return text
+    return trim_to_sentence(text[:max_chars])
+
+def trim_to_sentence(text):
+    """Drops an unfinished last sentence, or the last word if no full sentence ends past halfway."""
+    text = text.strip()
+    if not text or text[-1] in ".!?":
+        return text
+    sentence_end = max(text.rfind(". "), text.rfind("! "), text.rfind("? "), text.rfind("\n"))
+    if sentence_end > len(text) // 2:
+        return text[:sentence_end + 1].strip()
+    return text.rsplit(" ", 1)[0].rstrip(",;:")
 
 def parse_float(val):
     """Safely parse float from string or number."""
@@ -116,58 +402,177 @@ def parse_float(val):
     except (ValueError, TypeError):
         return None
 
+def temperature_band(temperatureMax):
+    """The COHORT_TEMP_BAND_C-wide band (low, high) holding a temperature, None if unknown."""
+    temp = parse_float(temperatureMax)
+    if temp is None or math.isnan(temp):
+        return None
+    low = math.floor(temp / COHORT_TEMP_BAND_C) * COHORT_TEMP_BAND_C
+    return (low, low + COHORT_TEMP_BAND_C)
+
+def cohort_key(anc_pnc, med_conds, temperatureMax, is_swahili):
+    """Canonical key of the inputs that shape a cohort's advice (those of build_query, plus language)."""
+    return (
+        str(anc_pnc or "").strip().upper(),
+        str(med_conds or "none").strip().lower(),
+        temperature_band(temperatureMax),
+        "sw" if is_swahili else "en",
+    )
+
+def fill_template(advice, temperatureMax):
+    """Fills a cohort message in for one recipient."""
+    temp = parse_float(temperatureMax)
+    # "32C" rather than "32°C": a degree sign would take the SMS out of GSM-7
+    return advice.replace(TEMPERATURE_PLACEHOLDER, f"{temp:g}C" if temp is not None else "high temperatures")
+
+def generate_advice(anc_pnc_value, med_conds, temp, is_swahili, band=None):
+    """KB retrieval plus Claude for one recipient, or for a cohort when its temperature band is given."""
+    # Step 1: Build query and retrieve context from KB
+    query = build_query(anc_pnc_value, med_conds, band[0] if band else temp)
+    kb_snippets = call_bedrock_kb_retrieve(query, KB_ID)
+
+    # Step 2: Generate advice with Claude
+    if band:
+        prompt = build_sms_prompt(kb_snippets, anc_pnc_value, med_conds, f"{band[0]:g}-{band[1]:g}", is_swahili, template=True)
+    else:
+        prompt = build_sms_prompt(kb_snippets, anc_pnc_value, med_conds, temp, is_swahili)
+    return call_bedrock_claude(prompt, LLM_MODEL_ID)
+
+def generate_cohort_advice(key, members):
+    """Advice for a cohort, from its first member's profile."""
+    _, msg, _, is_swahili = members[0]
+    band = key[2] if COHORT_MODE else None
+    return generate_advice(
+        msg.get("anc_pnc_value", "unknown"),
+        msg.get("medical_conditions", "none"),
+        msg.get("temperatureMax"),
+        is_swahili,
+        band,
+    )
+
 def lambda_handler(event, context):
     """
     Generates personalized messages using Bedrock KB + Claude.
+    In COHORT_MODE, advice is generated once per cohort of the batch.
     Queues final messages to NotifyQueue.
+    Returns the message IDs of records that failed so only those are redelivered.
     """
+    global kb_cache_warmed
+    if KB_CACHE_WARMUP and not kb_cache_warmed:
+        # Once per container, leaving most of the invocation's time for the batch
+        kb_cache_warmed = True
+        budget = KB_WARMUP_BUDGET_SECONDS
+        if context is not None:
+            budget = min(budget, context.get_remaining_time_in_millis() / 1000 / 4)
+        warm_kb_cache(budget)
+
+    records = event['Records']
     processed = 0
-    
-    for record in event['Records']:
-        msg = json.loads(record['body'])
-        
-        lat = parse_float(msg.get("latitude"))
-        lon = parse_float(msg.get("longitude"))
+    stream_timings.clear()
+    failed_ids = set()
+    publisher = SqsBatchPublisher(sqs, NOTIFY_QUEUE_URL)
+
+    # Group the batch's records by cohort, in arrival order (each record is its own cohort without COHORT_MODE)
+    cohorts = {}
+    for record in records:
+        try:
+            msg = json.loads(record['body'])
+        except Exception as e:
+            print(f"[MessageGeneratorFn] Could not parse weather result: {e}")
+            failed_ids.add(record['messageId'])
+            continue
         anc_pnc_value = msg.get("anc_pnc_value", "unknown")
         med_conds = msg.get("medical_conditions", "none")
-        temp = msg.get("temperatureMax")
-        
+
         # Parse language (accept sw, swh, swahili, etc.)
         language = str(msg.get("language", "en")).strip().lower()
         is_swahili = language.startswith("sw") or language == "swahili"
-        
-        # Step 1: Build query and retrieve context from KB
-        query = build_query(anc_pnc_value, med_conds, temp)
-        kb_snippets = call_bedrock_kb_retrieve(query, KB_ID)
-        
-        # Step 2: Generate advice with Claude
-        prompt = build_sms_prompt(kb_snippets, anc_pnc_value, med_conds, temp, is_swahili)
-        advice = call_bedrock_claude(prompt, LLM_MODEL_ID)
-        
-        # Step 3: Queue final message
-        output = {
-            "contact_uuid": msg.get("contact_uuid"),
-            "latitude": lat,
-            "longitude": lon,
-            "todayDate": msg.get("todayDate"),
-            "temperatureMax": temp,
-            "anc_pnc_value": anc_pnc_value,
-            "medical_conditions": med_conds,
-            "advice": advice,
-            "language": language,
-            "phone_number": msg.get("phone_number"),
-            "facility_name": msg.get("facility_name"),
-        }
-        
-        sqs.send_message(
-            QueueUrl=NOTIFY_QUEUE_URL,
-            MessageBody=json.dumps(output)
-        )
-        
-        print(f"[MessageGeneratorFn] Message generated successfully (length: {len(advice)} chars)")
-        processed += 1
-    
+
+        key = cohort_key(anc_pnc_value, med_conds, msg.get("temperatureMax"), is_swahili) if COHORT_MODE else record['messageId']
+        cohorts.setdefault(key, []).append((record['messageId'], msg, language, is_swahili))
+
+    # Generate each cohort's advice concurrently; batch latency is then about the slowest call
+    workers = max(1, min(GENERATION_CONCURRENCY, len(cohorts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {key: pool.submit(generate_cohort_advice, key, members) for key, members in cohorts.items()}
+
+    generated = 0
+    for key, members in cohorts.items():
+        try:
+            advice = futures[key].result()
+        except BedrockUnavailable as e:
+            print(f"[MessageGeneratorFn] Bedrock unavailable, retrying {len(members)} record(s): {e}")
+            failed_ids.update(message_id for message_id, _, _, _ in members)
+            continue
+        generated += 1
+        band = key[2] if COHORT_MODE else None
+
+        for message_id, msg, language, _ in members:
+            lat = parse_float(msg.get("latitude"))
+            lon = parse_float(msg.get("longitude"))
+            anc_pnc_value = msg.get("anc_pnc_value", "unknown")
+            med_conds = msg.get("medical_conditions", "none")
+            temp = msg.get("temperatureMax")
+            recipient_advice = fill_template(advice, temp) if band else advice
+            if STREAM_ADVICE:
+                recipient_advice = fit_sms(recipient_advice)
+
+            # Step 3: Queue final message
+            output = {
+                "contact_uuid": msg.get("contact_uuid"),
+                "latitude": lat,
+                "longitude": lon,
+                "todayDate": msg.get("todayDate"),
+                "temperatureMax": temp,
+                "anc_pnc_value": anc_pnc_value,
+                "medical_conditions": med_conds,
+                "advice": recipient_advice,
+                "language": language,
+                "phone_number": msg.get("phone_number"),
+                "facility_name": msg.get("facility_name"),
+            }
+
+            # Tag each message with its source record so a failed send fails that record
+            publisher.publish(output, tag=message_id)
+
+            print(f"[MessageGeneratorFn] Message generated successfully (length: {len(recipient_advice)} chars)")
+            processed += 1
+
+    saved = processed - generated
+    print(f"[MessageGeneratorFn] {processed} recipients in {generated} cohort(s): {saved} Bedrock generation(s) saved")
+    cache_stats = advice_cache.stats(reset=True)
+    kb_stats = kb_cache.stats(reset=True)
+    print(f"[MessageGeneratorFn] Advice cache: {cache_stats}, KB cache: {kb_stats}")
+    emit_metrics("MessageGeneratorFn", {
+        "Recipients": processed,
+        "Cohorts": generated,
+        "BedrockCallsSaved": saved,
+        "AdviceCacheHits": cache_stats["hits"],
+        "AdviceCacheSharedHits": cache_stats["sharedHits"],
+        "AdviceCacheMisses": cache_stats["misses"],
+        "KbCacheHits": kb_stats["hits"] + kb_stats["sharedHits"],
+        "KbRetrievals": kb_stats["misses"],
+    })
+    if stream_timings:
+        # One value per generation, so CloudWatch can report percentiles
+        emit_metrics("MessageGeneratorFn", {
+            "AdviceTimeToFirstToken": [ttft for ttft, _ in stream_timings],
+            "AdviceLatency": [total for _, total in stream_timings],
+        }, unit="Milliseconds")
+
+    for failure in publisher.flush():
+        print(f"[MessageGeneratorFn] Failed to queue message: {failure['code']} {failure['message']}")
+        failed_ids.add(failure['tag'])
+
+    if failed_ids:
+        print(f"[MessageGeneratorFn] {len(failed_ids)} of {len(records)} records failed and will be retried")
+
     return {
         "statusCode": 200,
-        "processed_records": processed
+        "processed_records": processed,
+        # Partial batch response (reportBatchItemFailures): only these records are redelivered
+        "batchItemFailures": [
+            {"itemIdentifier": record['messageId']}
+            for record in records if record['messageId'] in failed_ids
+        ],
     }
@@ -2,41 +2,72 @@ import boto3
 import os
 import json
 import datetime
-from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from boto3.dynamodb.types import TypeDeserializer
+from sqs_batch import SqsBatchPublisher
+from locations import location_cell, cell_key, cell_center
 
 # Environment variables set by CDK
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(os.environ.get("RECIPIENTS_TABLE_NAME", os.environ.get("MUM_TABLE_NAME")))
+TABLE_NAME = os.environ.get("RECIPIENTS_TABLE_NAME", os.environ.get("MUM_TABLE_NAME"))
 sqs = boto3.client("sqs")
+s3 = boto3.client("s3")
+lambda_client = boto3.client("lambda")
 QUEUE_URL = os.environ["LOCATION_QUEUE_URL"]
 
-def float_safe(val):
-    """Convert Decimal or numeric types to float safely."""
-    if isinstance(val, Decimal):
-        return float(val)
-    if isinstance(val, (float, int)):
-        return float(val)
-    try:
-        return float(val)
-    except Exception:
-        return None
+# Checkpointing: when the remaining time drops below CHECKPOINT_MARGIN_MS, the scan
+# position, the cells queued so far (packed integer cell IDs, or location keys when
+# reading the location index) and any location messages that could not be queued
+# are saved to S3 and the function re-invokes itself to continue. Disabled when
+# CHECKPOINT_BUCKET is not set.
+CHECKPOINT_BUCKET = os.environ.get("CHECKPOINT_BUCKET")
+CHECKPOINT_PREFIX = os.environ.get("CHECKPOINT_PREFIX", "checkpoints/recipients-to-locations/")
+CHECKPOINT_MARGIN_MS = int(os.environ.get("CHECKPOINT_MARGIN_MS", 60000))
 
-def lambda_handler(event, context):
-    """
-    Scans DynamoDB for recipient profiles, deduplicates by location,
-    and queues unique locations for weather checking.
-    """
-    today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
-    
-    # Allow manual override for testing
-    if isinstance(event, dict) and "todayDate" in event and event["todayDate"]:
-        today = str(event["todayDate"])
-    
-    dedup_set = set()
-    scanned = 0
-    considered = 0
+# Where unique locations come from: "scan" (full table scan), "eligible"
+# (query only recipients eligible today via the sparse AlertEligibleIndex GSI)
+# or "index" (precomputed LocationCellIndex table maintained by LocationIndexerFn)
+LOCATION_SOURCE = os.environ.get("LOCATION_SOURCE", "scan")
+LOCATION_INDEX_TABLE_NAME = os.environ.get("LOCATION_INDEX_TABLE_NAME")
+
+# Sparse GSI holding only the "#cell" summary rows of the location index (one
+# per location, not one per recipient), spread over CELL_SHARDS partitions
+# (must match LocationIndexerFn)
+CELL_ROW_INDEX = "CellRowIndex"
+CELL_SHARDS = int(os.environ.get("CELL_SHARDS", 4))
+
+# Sparse GSI holding only recipients with a valid location, spread over
+# ALERT_SHARDS partitions (must match LocationIndexerFn)
+ALERT_ELIGIBLE_INDEX = "AlertEligibleIndex"
+ALERT_SHARDS = int(os.environ.get("ALERT_SHARDS", 8))
+
+# Number of parallel scan segments (1 = single sequential scan)
+SCAN_SEGMENTS = int(os.environ.get("SCAN_SEGMENTS", 1))
 
-    scan_kwargs = {
+# The scan hot loop uses the low-level client: items arrive in wire format and
+# numbers are parsed straight to float instead of through Decimal. Its pool has
+# a connection for every segment or shard read in parallel (botocore's default is 10)
+dynamodb_client = boto3.client(
+    "dynamodb",
+    config=Config(max_pool_connections=max(SCAN_SEGMENTS, ALERT_SHARDS, CELL_SHARDS, 10)),
+)
+
+# Dense locations are split across several messages to stay under the SQS size limit
+MAX_RECIPIENTS_PER_MESSAGE = int(os.environ.get("MAX_RECIPIENTS_PER_MESSAGE", 500))
+
+# Profile fields carried to downstream functions for each recipient
+RECIPIENT_FIELDS = (
+    "contact_uuid", "language", "anc_pnc_value", "medical_conditions", "status",
+    "facility_code", "facility_name", "phone_number", "lastAlertedDate",
+)
+
+# Scan projections: "full" reads every profile field needed downstream; "minimal"
+# reads only what location dedup needs and queues recipient IDs, leaving
+# WeatherFetchFn to load full profiles (BatchGetItem) only for alerting locations
+SCAN_PROJECTION = os.environ.get("SCAN_PROJECTION", "full")
+
+PROJECTIONS = {
+    "full": {
         "ProjectionExpression": (
             "#cid,latitude,longitude,lastAlertedDate,#lang,anc_pnc_value,"
             "medical_conditions,#stat,facility_code,facility_name,phone_number"
@@ -46,69 +77,400 @@ def lambda_handler(event, context):
             "#lang": "language",
             "#stat": "status"
         }
-    }
+    },
+    "minimal": {
+        "ProjectionExpression": "#cid,latitude,longitude,lastAlertedDate",
+        "ExpressionAttributeNames": {
+            "#cid": "contact_uuid"
+        }
+    },
+}
+
+deserializer = TypeDeserializer()
+
+def wire_float(attr):
+    """Read a number from a wire-format attribute ({"N": "1.23"}) without building a Decimal."""
+    if attr is None:
+        return None
+    try:
+        return float(attr.get("N", attr.get("S")))
+    except (TypeError, ValueError):
+        return None
+
+def wire_value(attr):
+    """Read a profile field from a wire-format attribute. Numbers keep their string form."""
+    if attr is None:
+        return None
+    if "S" in attr:
+        return attr["S"]
+    if "N" in attr:
+        return attr["N"]
+    if "NULL" in attr:
+        return None
+    return deserializer.deserialize(attr)
+
+def add_to_locations(locations, item, today, projection="full"):
+    """
+    Adds one wire-format profile to its location group.
+    Returns False if the profile is skipped.
+    """
+    lat = wire_float(item.get("latitude"))
+    lon = wire_float(item.get("longitude"))
+    
+    # Skip if no valid coordinates or coordinates are (0, 0)
+    if lat is None or lon is None or (lat == 0.0 and lon == 0.0):
+        return False
+    
+    # One-alert-per-day logic
+    if wire_value(item.get("lastAlertedDate")) == today:
+        return False
     
-    response = table.scan(**scan_kwargs)
-    items = response["Items"]
+    # Deduplicate by spatial bucket (LOCATION_BUCKETING, default 3 decimal places ≈ 111m),
+    # keyed by the packed integer cell ID rather than a formatted string
+    cell = location_cell(lat, lon)
+    recipients = locations.get(cell)
+    if recipients is None:
+        recipients = locations[cell] = []
+
+    if projection == "minimal":
+        recipients.append(item["contact_uuid"]["S"])
+    else:
+        # Keep profile values as a compact tuple; the message dict is only built when queuing
+        recipients.append(tuple(wire_value(item.get(field)) for field in RECIPIENT_FIELDS))
+    return True
+
+def expand_profile(values):
+    """Turns a compact profile tuple into a message dict without empty fields."""
+    return {
+        field: value for field, value in zip(RECIPIENT_FIELDS, values)
+        if value is not None
+    }
+
+def scan_segment(today, segment=0, total_segments=1, start_key=None, should_stop=None, projection="full"):
+    """
+    Scans one segment of the recipients table and groups recipients by location.
+    Stops after the current page once should_stop() returns True.
+    Returns the number of items scanned, a dict of cell ID -> compact recipient profiles,
+    and the key to resume from (None once the segment is finished).
+    """
+    scan_kwargs = {"TableName": TABLE_NAME, **PROJECTIONS[projection]}
+    if total_segments > 1:
+        scan_kwargs.update(Segment=segment, TotalSegments=total_segments)
+    if start_key:
+        scan_kwargs["ExclusiveStartKey"] = start_key
+
+    locations = {}
+    scanned = 0
 
     while True:
-        for item in items:
+        response = dynamodb_client.scan(**scan_kwargs)
+
+        for item in response["Items"]:
             scanned += 1
-            lat = float_safe(item.get("latitude"))
-            lon = float_safe(item.get("longitude"))
-            
-            # Skip if no valid coordinates or coordinates are (0, 0)
-            if lat is None or lon is None or (lat == 0.0 and lon == 0.0):
-                continue
-            
-            # One-alert-per-day logic
-            if item.get("lastAlertedDate") == today:
-                continue
-            
-            # Deduplicate by rounded location (3 decimal places ≈ 111m precision)
-            loc_key = f"{round(lat,3)},{round(lon,3)}"
-            if loc_key in dedup_set:
+            add_to_locations(locations, item, today, projection)
+
+        # Handle pagination
+        if "LastEvaluatedKey" not in response:
+            return scanned, locations, None
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        if should_stop and should_stop():
+            return scanned, locations, response["LastEvaluatedKey"]
+
+def query_eligible_shard(today, shard, start_key=None, should_stop=None, projection="full"):
+    """
+    Queries one shard of the sparse AlertEligibleIndex for recipients eligible today
+    (nextAlertDate <= today). Recipients already alerted today are never read.
+    Returns the same tuple as scan_segment.
+    """
+    query_kwargs = {
+        "TableName": TABLE_NAME,
+        **PROJECTIONS[projection],
+        "IndexName": ALERT_ELIGIBLE_INDEX,
+        "KeyConditionExpression": "alertShard = :shard AND nextAlertDate <= :today",
+        "ExpressionAttributeValues": {":shard": {"S": str(shard)}, ":today": {"S": today}},
+    }
+    if start_key:
+        query_kwargs["ExclusiveStartKey"] = start_key
+
+    locations = {}
+    read = 0
+
+    while True:
+        response = dynamodb_client.query(**query_kwargs)
+
+        for item in response["Items"]:
+            read += 1
+            add_to_locations(locations, item, today, projection)
+
+        if "LastEvaluatedKey" not in response:
+            return read, locations, None
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        if should_stop and should_stop():
+            return read, locations, response["LastEvaluatedKey"]
+
+def merge_locations(results):
+    """Merges per-segment (or per-shard) location groups into one dict."""
+    scanned = 0
+    dedup_map = {}
+    for seg_scanned, locations in results:
+        scanned += seg_scanned
+        for cell, recipients in locations.items():
+            if cell in dedup_map:
+                dedup_map[cell].extend(recipients)
+            else:
+                dedup_map[cell] = recipients
+    return scanned, dedup_map
+
+def query_cell_shard(shard, start_key=None, should_stop=None):
+    """
+    Queries one shard of the sparse CellRowIndex for the location index's cells,
+    reading one summary row per location instead of every member row.
+    Returns the number of recipients indexed, a dict of location key ->
+    (lat, lon, recipient count) and the key to resume from (None once finished).
+    Member IDs are left to WeatherFetchFn, which reads them only for alerting locations.
+    """
+    query_kwargs = {
+        "TableName": LOCATION_INDEX_TABLE_NAME,
+        "IndexName": CELL_ROW_INDEX,
+        "KeyConditionExpression": "cellShard = :shard",
+        "ExpressionAttributeValues": {":shard": {"S": str(shard)}},
+    }
+    if start_key:
+        query_kwargs["ExclusiveStartKey"] = start_key
+
+    locations = {}
+    indexed = 0
+
+    while True:
+        response = dynamodb_client.query(**query_kwargs)
+
+        for row in response["Items"]:
+            count = int(row.get("recipient_count", {}).get("N", 0))
+            if count <= 0:
                 continue
+            indexed += count
+            locations[row["cell"]["S"]] = (wire_float(row["latitude"]), wire_float(row["longitude"]), count)
+
+        if "LastEvaluatedKey" not in response:
+            return indexed, locations, None
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        if should_stop and should_stop():
+            return indexed, locations, response["LastEvaluatedKey"]
+
+def read_parts(reader, parts, cursors, should_stop):
+    """
+    Runs reader(part, start_key, should_stop) for every part (scan segment or index
+    shard) in parallel, then merges the location groups.
+    Returns items read, merged location groups and the cursors of unfinished parts.
+    """
+    if not parts:
+        return 0, {}, {}
+
+    with ThreadPoolExecutor(max_workers=len(parts)) as pool:
+        results = list(pool.map(
+            lambda part: reader(part, cursors.get(str(part)), should_stop),
+            parts
+        ))
+
+    remaining = {
+        str(part): cursor for part, (_, _, cursor) in zip(parts, results)
+        if cursor is not None
+    }
+    scanned, dedup_map = merge_locations((read, locations) for read, locations, _ in results)
+    return scanned, dedup_map, remaining
+
+def publish_location(publisher, today, loc_key, lat, lon, field, recipients):
+    """
+    Queues the messages for one location, splitting very dense locations.
+    `field` is "recipients" (full profiles) or "recipientIds". Returns the recipient count.
+    """
+    for start in range(0, len(recipients), MAX_RECIPIENTS_PER_MESSAGE):
+        message = {
+            "latitude": lat,
+            "longitude": lon,
+            "locationKey": loc_key,
+            "todayDate": today,
+            field: recipients[start:start + MAX_RECIPIENTS_PER_MESSAGE],
+        }
+        # Tagged with the message itself so a failed send can be saved and retried
+        publisher.publish(message, tag=message)
+    return len(recipients)
+
+def checkpoint_key(today):
+    return f"{CHECKPOINT_PREFIX}{today}.json"
 
-            # Build enriched SQS message with all needed fields
-            msg = {
+def load_checkpoint(today):
+    """Loads today's checkpoint from S3, or None if there isn't one."""
+    if not CHECKPOINT_BUCKET:
+        return None
+    try:
+        response = s3.get_object(Bucket=CHECKPOINT_BUCKET, Key=checkpoint_key(today))
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(response["Body"].read())
+
+def save_checkpoint(state):
+    s3.put_object(
+        Bucket=CHECKPOINT_BUCKET,
+        Key=checkpoint_key(state["todayDate"]),
+        Body=json.dumps(state),
+        ContentType="application/json"
+    )
+
+def lambda_handler(event, context):
+    """
+    Scans DynamoDB for recipient profiles, groups them by location,
+    and queues one message per unique location for weather checking.
+    Each message lists every recipient at that location.
+
+    Long scans are checkpointed to S3 and continued by re-invoking this function.
+    Pages read before a checkpoint are never re-read, and an already completed
+    run for the same day is not repeated (pass "restart": true to force it).
+    Messages that could not be queued stay in the checkpoint and the run is not
+    complete until they are sent; if nothing else is left the invocation fails,
+    so the asynchronous retry sends them.
+    """
+    event = event if isinstance(event, dict) else {}
+    today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+    
+    # Allow manual override for testing
+    if event.get("todayDate"):
+        today = str(event["todayDate"])
+
+    state = None if event.get("restart") else load_checkpoint(today)
+    if state and state.get("complete"):
+        print(f"[RecipientsToLocationsFn] Run for {today} already completed, nothing to do")
+        return {
+            "statusCode": 200,
+            "alreadyComplete": True,
+            "recipientsScanned": state["recipientsScanned"],
+            "uniqueLocationsQueued": len(state["queuedCells"]),
+            "todayDate": today
+        }
+
+    if state is None:
+        total_segments = int(event.get("scanSegments") or SCAN_SEGMENTS)
+        state = {
+            "todayDate": today,
+            "locationSource": str(event.get("locationSource") or LOCATION_SOURCE),
+            "projection": str(event.get("scanProjection") or SCAN_PROJECTION),
+            "totalSegments": max(1, total_segments),
+            "cursors": {},
+            "finishedParts": [],
+            "unsentMessages": [],
+            "queuedCells": [],
+            "repeatLocationMessages": 0,
+            "recipientsScanned": 0,
+            "recipientsQueued": 0,
+            "messagesQueued": 0,
+            "invocations": 0,
+        }
+    else:
+        print(f"[RecipientsToLocationsFn] Resuming run for {today} from checkpoint")
+    state["invocations"] += 1
+
+    location_source = state["locationSource"]
+    total_segments = state["totalSegments"]
+    projection = state["projection"]
+
+    def should_stop():
+        return (
+            CHECKPOINT_BUCKET is not None and context is not None
+            and context.get_remaining_time_in_millis() < CHECKPOINT_MARGIN_MS
+        )
+
+    if location_source == "index":
+        all_parts = range(CELL_SHARDS)
+        reader = query_cell_shard
+    elif location_source == "eligible":
+        all_parts = range(ALERT_SHARDS)
+        reader = lambda shard, key, stop: query_eligible_shard(today, shard, key, stop, projection)
+    else:
+        all_parts = range(total_segments)
+        reader = lambda segment, key, stop: scan_segment(
+            today, segment, total_segments, key, stop, projection
+        )
+
+    parts = [part for part in all_parts if str(part) not in state["finishedParts"]]
+    scanned, dedup_map, remaining = read_parts(reader, parts, state["cursors"], should_stop)
+    state["finishedParts"].extend(str(part) for part in parts if str(part) not in remaining)
+    print(f"[RecipientsToLocationsFn] Read {len(dedup_map)} locations ({scanned} recipients) across {len(parts)} {location_source} part(s)")
+
+    # Queue one message per location (split if very dense) in batches of 10,
+    # after any that an earlier invocation failed to queue
+    publisher = SqsBatchPublisher(sqs, QUEUE_URL)
+    for message in state["unsentMessages"]:
+        publisher.publish(message, tag=message)
+    recipients_queued = 0
+    if location_source == "index":
+        for loc_key, (lat, lon, count) in dedup_map.items():
+            # WeatherFetchFn reads the cell's members from the index if it alerts
+            message = {
                 "latitude": lat,
                 "longitude": lon,
+                "locationKey": loc_key,
                 "todayDate": today,
-                "contact_uuid": item.get("contact_uuid"),
-                "language": item.get("language", "en"),
-                "anc_pnc_value": item.get("anc_pnc_value"),
-                "medical_conditions": item.get("medical_conditions"),
-                "status": item.get("status"),
-                "facility_code": item.get("facility_code"),
-                "facility_name": item.get("facility_name"),
-                "phone_number": item.get("phone_number"),
-                "lastAlertedDate": item.get("lastAlertedDate"),
+                "recipientCount": count,
             }
-            
-            print(f"[RecipientsToLocationsFn] Queuing location for weather check")
-            
-            sqs.send_message(
-                QueueUrl=QUEUE_URL,
-                MessageBody=json.dumps(msg)
+            publisher.publish(message, tag=message)
+            recipients_queued += count
+    else:
+        for cell, recipients in dedup_map.items():
+            if projection == "minimal":
+                field, payload = "recipientIds", recipients
+            else:
+                field, payload = "recipients", [expand_profile(values) for values in recipients]
+            recipients_queued += publish_location(
+                publisher, today, cell_key(cell), *cell_center(cell), field, payload
             )
-            
-            dedup_set.add(loc_key)
-            considered += 1
+    failures = publisher.flush()
 
-        # Handle pagination
-        if "LastEvaluatedKey" in response:
-            response = table.scan(
-                **scan_kwargs,
-                ExclusiveStartKey=response["LastEvaluatedKey"]
-            )
-            items = response["Items"]
-        else:
-            break
+    # Keep failed messages for the next attempt, except ones SQS rejected outright
+    unsent = []
+    for failure in failures:
+        print(f"[RecipientsToLocationsFn] Failed to queue location: {failure['code']} {failure['message']}")
+        if not failure["senderFault"]:
+            unsent.append(failure["tag"])
+    print(f"[RecipientsToLocationsFn] Queued {len(dedup_map)} locations ({recipients_queued} recipients) for weather check")
+
+    # A location whose recipients are read across several invocations gets one
+    # message per invocation, each with only the recipients read in it: every
+    # recipient is delivered once, and the repeat weather lookups are served by
+    # WeatherFetchFn's forecast cache. Queued cells are kept in the checkpoint so
+    # locations are counted once and repeats are reported separately.
+    queued_cells = set(state["queuedCells"])
+    repeats = sum(1 for cell in dedup_map if cell in queued_cells)
+    queued_cells.update(dedup_map)
+    state["queuedCells"] = sorted(queued_cells)
+    state["repeatLocationMessages"] += repeats
+    state["unsentMessages"] = unsent
+    state["cursors"] = remaining
+    state["recipientsScanned"] += scanned
+    state["recipientsQueued"] += recipients_queued
+    state["messagesQueued"] += publisher.sent
+    state["complete"] = not remaining and not unsent
+
+    if CHECKPOINT_BUCKET:
+        save_checkpoint(state)
+    if remaining:
+        print(f"[RecipientsToLocationsFn] Checkpointed with {len(remaining)} part(s) left, continuing in a new invocation")
+        lambda_client.invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json.dumps({"todayDate": today})
+        )
+    elif unsent and CHECKPOINT_BUCKET:
+        raise RuntimeError(f"{len(unsent)} location message(s) could not be queued; saved in the checkpoint for retry")
 
     return {
         "statusCode": 200,
-        "recipientsScanned": scanned,
-        "uniqueLocationsQueued": considered,
+        "recipientsScanned": state["recipientsScanned"],
+        "recipientsQueued": state["recipientsQueued"],
+        "uniqueLocationsQueued": len(state["queuedCells"]),
+        "repeatLocationMessages": state["repeatLocationMessages"],
+        "messagesQueued": state["messagesQueued"],
+        "failedToQueue": len(failures),
+        "complete": state["complete"],
+        "invocations": state["invocations"],
         "todayDate": today
     }
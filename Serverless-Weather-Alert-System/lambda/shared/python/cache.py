@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Two-tier cache shared by the Lambda functions:
+#
+#   L1 - in-process LRU, survives between warm invocations of one container
+#   L2 - DynamoDB table shared by every container, expired by DynamoDB TTL
+#
+# Values must be JSON-serializable. Items carry their own expiry time because
+# DynamoDB TTL deletes lazily, so expired items can still be read for a while.
+
+
+class TieredCache:
+    """
+    In-process LRU in front of a shared DynamoDB cache table.
+
+    `namespace` prefixes every key so several caches can share one table.
+    Without a table name only the in-process layer is used.
+    """
+
+    def __init__(self, namespace, dynamodb_client=None, table_name=None,
+                 ttl_seconds=3600, max_entries=1024):
+        self.namespace = namespace
+        self.dynamodb = dynamodb_client
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "sharedHits": 0, "misses": 0, "errors": 0}
+
+    def _key(self, key):
+        return f"{self.namespace}#{key}"
+
+    def get(self, key):
+        """Returns the cached value, or None on a miss."""
+        cache_key = self._key(key)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(cache_key)
+                self._stats["hits"] += 1
+                return entry[1]
+            if entry:
+                del self._entries[cache_key]
+
+        value = self._get_shared(cache_key, now)
+
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+            else:
+                self._stats["sharedHits"] += 1
+        return value
+
+    def put(self, key, value):
+        """Stores a value in both layers. Shared-layer errors are logged, not raised."""
+        cache_key = self._key(key)
+        expires_at = int(time.time()) + self.ttl_seconds
+        self._put_local(cache_key, value, expires_at)
+
+        if not self.table_name:
+            return
+        try:
+            self.dynamodb.put_item(
+                TableName=self.table_name,
+                Item={
+                    "cache_key": {"S": cache_key},
+                    "value": {"S": json.dumps(value)},
+                    "expires_at": {"N": str(expires_at)},
+                }
+            )
+        except Exception as e:
+            print(f"[TieredCache] Failed to write {cache_key}: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+
+    def stats(self, reset=False):
+        """Hit/miss counters since the last reset."""
+        with self._lock:
+            stats = dict(self._stats)
+            if reset:
+                for name in self._stats:
+                    self._stats[name] = 0
+        return stats
+
+    def _put_local(self, cache_key, value, expires_at):
+        with self._lock:
+            self._entries[cache_key] = (expires_at, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_shared(self, cache_key, now):
+        if not self.table_name:
+            return None
+        try:
+            response = self.dynamodb.get_item(
+                TableName=self.table_name,
+                Key={"cache_key": {"S": cache_key}},
+            )
+        except Exception as e:
+            print(f"[TieredCache] Failed to read {cache_key}: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+            return None
+
+        item = response.get("Item")
+        if not item or float(item["expires_at"]["N"]) <= now:
+            return None
+
+        value = json.loads(item["value"]["S"])
+        # Promote to the in-process layer for the rest of the item's lifetime
+        self._put_local(cache_key, value, int(item["expires_at"]["N"]))
+        return value
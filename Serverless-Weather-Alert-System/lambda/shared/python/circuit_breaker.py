@@ -0,0 +1,136 @@
+import threading
+import time
+from botocore.exceptions import ClientError
+
+# Circuit breaker for calls to an external provider, shared by every container.
+#
+# Consecutive failures (timeouts, 429s, 5xx) are counted in one DynamoDB item.
+# Once they reach `failure_threshold`, or the provider sends Retry-After, the
+# circuit opens: callers fail fast until `open_until` instead of waiting on a
+# provider that is down. After that the next call is a probe; if it fails the
+# circuit re-opens at once, for twice as long, and a success closes it again.
+# The circuit never opens for longer than `max_open_seconds`, even when
+# Retry-After asks for more (e.g. hours until a daily quota resets).
+#
+# State is re-read at most every `refresh_seconds`, so an open circuit costs
+# no provider calls and almost no DynamoDB reads.
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider while its circuit is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} circuit open, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Failure-counting circuit breaker with state in DynamoDB (or in-process without a table)."""
+
+    def __init__(self, dynamodb_client, table_name, name, failure_threshold=5,
+                 open_seconds=30, max_open_seconds=900, refresh_seconds=5):
+        self.dynamodb = dynamodb_client
+        self.table_name = table_name
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.refresh_seconds = refresh_seconds
+        self.key = {"state_key": {"S": f"{name}#circuit"}}
+        self._state = {"failures": 0, "opens": 0, "open_until": 0.0}
+        self._read_at = 0.0
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        """Seconds until the circuit closes (0 when closed)."""
+        return max(self._current()["open_until"] - time.time(), 0)
+
+    def check(self):
+        """Raises CircuitOpenError while the circuit is open."""
+        retry_in = self.retry_in()
+        if retry_in > 0:
+            raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self):
+        state = self._current()
+        if not state["failures"] and not state["opens"]:
+            return
+        with self._lock:
+            self._state = {"failures": 0, "opens": 0, "open_until": 0.0}
+        if self.table_name:
+            self._write("SET failures = :zero, opens = :zero REMOVE open_until", {":zero": {"N": "0"}})
+
+    def record_failure(self, retry_after=None):
+        """Counts a failure; opens the circuit at the threshold, on a failed probe, or on Retry-After."""
+        now = time.time()
+        with self._lock:
+            self._state["failures"] += 1
+            state = dict(self._state)
+
+        if self.table_name:
+            attributes = self._write(
+                "ADD failures :one SET expires_at = :expires",
+                {":one": {"N": "1"}, ":expires": {"N": str(int(now) + 86400)}},
+                return_values="ALL_NEW",
+            )
+            if attributes:
+                state = self._parse(attributes)
+
+        if not (retry_after or state["failures"] >= self.failure_threshold or state["opens"]):
+            return
+        if state["open_until"] > now:
+            return  # Already opened by another caller
+
+        open_for = min(retry_after or self.open_seconds * 2 ** state["opens"], self.max_open_seconds)
+        with self._lock:
+            self._state = {"failures": 0, "opens": state["opens"] + 1, "open_until": now + open_for}
+        print(f"[CircuitBreaker] {self.name} circuit opened for {open_for:.0f}s")
+        if self.table_name:
+            self._write(
+                "SET open_until = :until, failures = :zero ADD opens :one",
+                {
+                    ":until": {"N": repr(now + open_for)},
+                    ":zero": {"N": "0"},
+                    ":one": {"N": "1"},
+                    ":now": {"N": repr(now)},
+                },
+                condition="attribute_not_exists(open_until) OR open_until < :now",
+            )
+
+    def _current(self):
+        now = time.time()
+        if self.table_name and now - self._read_at >= self.refresh_seconds:
+            self._read_at = now
+            try:
+                item = self.dynamodb.get_item(TableName=self.table_name, Key=self.key).get("Item")
+                with self._lock:
+                    self._state = self._parse(item or {})
+            except ClientError as e:
+                print(f"[CircuitBreaker] Using local state for {self.name}: {e}")
+        with self._lock:
+            return dict(self._state)
+
+    @staticmethod
+    def _parse(item):
+        return {
+            "failures": int(item.get("failures", {}).get("N", 0)),
+            "opens": int(item.get("opens", {}).get("N", 0)),
+            "open_until": float(item.get("open_until", {}).get("N", 0)),
+        }
+
+    def _write(self, update, values, condition=None, return_values="NONE"):
+        kwargs = {
+            "TableName": self.table_name,
+            "Key": self.key,
+            "UpdateExpression": update,
+            "ExpressionAttributeValues": values,
+            "ReturnValues": return_values,
+        }
+        if condition:
+            kwargs["ConditionExpression"] = condition
+        try:
+            return self.dynamodb.update_item(**kwargs).get("Attributes")
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                print(f"[CircuitBreaker] Failed to update {self.name} state: {e}")
+            return None
@@ -0,0 +1,214 @@
+import os
+import math
+
+# Spatial bucketing shared by the scanner and the location indexer.
+# Recipients in the same bucket share one weather lookup, made at the bucket centre.
+#
+#   round    - coordinates rounded to N decimal places (default 3 ≈ 111m)
+#   geohash  - geohash cells of N characters (default 6 ≈ 1.2km x 0.6km)
+#   grid     - snap to a provider's native forecast grid of N degrees (default 0.1)
+#   hex      - hexagonal cells of N degrees centre-to-corner (default 0.05)
+#
+# Cells are identified by a packed integer (cell ID) so large dedup sets stay
+# compact; the string key is only built for messages and the LocationCellIndex table.
+LOCATION_BUCKETING = os.environ.get("LOCATION_BUCKETING", "round")
+LOCATION_RESOLUTION = os.environ.get("LOCATION_RESOLUTION")
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+SQRT3 = math.sqrt(3)
+
+# Lattice coordinates are offset into the unsigned 32-bit halves of a 64-bit integer
+PACK_OFFSET = 1 << 31
+PACK_MASK = (1 << 32) - 1
+
+
+def format_key(lat, lon):
+    """Coordinate-style bucket key, e.g. "-1.286,36.817"."""
+    return f"{lat},{lon}"
+
+
+def pack(i, j):
+    """Pack two signed lattice coordinates into one unsigned 64-bit integer."""
+    return ((i + PACK_OFFSET) << 32) | (j + PACK_OFFSET)
+
+
+def unpack(cell_id):
+    return (cell_id >> 32) - PACK_OFFSET, (cell_id & PACK_MASK) - PACK_OFFSET
+
+
+class LatticeBucketer:
+    """Base for bucketers whose cells are points (i, j) of an integer lattice."""
+
+    def lattice(self, lat, lon):
+        raise NotImplementedError
+
+    def point(self, i, j):
+        raise NotImplementedError
+
+    def cell_id(self, lat, lon):
+        return pack(*self.lattice(lat, lon))
+
+    def center_of(self, cell_id):
+        return self.point(*unpack(cell_id))
+
+    def key_of(self, cell_id):
+        return format_key(*self.center_of(cell_id))
+
+
+class RoundBucketer(LatticeBucketer):
+    """Rounds coordinates to a fixed number of decimal places."""
+
+    def __init__(self, decimals=3):
+        self.decimals = int(decimals)
+        self.scale = 10 ** self.decimals
+
+    def lattice(self, lat, lon):
+        return round(lat * self.scale), round(lon * self.scale)
+
+    def point(self, i, j):
+        return round(i / self.scale, self.decimals), round(j / self.scale, self.decimals)
+
+
+class GridBucketer(LatticeBucketer):
+    """Snaps coordinates to the nearest point of a regular lat/lon forecast grid."""
+
+    def __init__(self, step=0.1, origin_lat=0.0, origin_lon=0.0):
+        self.step = float(step)
+        self.origin_lat = float(origin_lat)
+        self.origin_lon = float(origin_lon)
+        # Enough decimals to print grid points without float noise
+        self.decimals = max(0, -math.floor(math.log10(self.step))) + 3
+
+    def lattice(self, lat, lon):
+        return (
+            round((lat - self.origin_lat) / self.step),
+            round((lon - self.origin_lon) / self.step),
+        )
+
+    def point(self, i, j):
+        return (
+            round(self.origin_lat + i * self.step, self.decimals),
+            round(self.origin_lon + j * self.step, self.decimals),
+        )
+
+
+class HexBucketer(LatticeBucketer):
+    """
+    Pointy-top hexagonal cells laid out in lat/lon degrees.
+    Hexagons give more uniform neighbour distances than square cells.
+    """
+
+    def __init__(self, size=0.05):
+        self.size = float(size)
+
+    def lattice(self, lat, lon):
+        # Axial coordinates, then cube rounding to the containing hexagon
+        q = (SQRT3 / 3 * lon - lat / 3) / self.size
+        r = (2 / 3 * lat) / self.size
+        x, z = q, r
+        y = -x - z
+        rx, ry, rz = round(x), round(y), round(z)
+        dx, dy, dz = abs(rx - x), abs(ry - y), abs(rz - z)
+        if dx > dy and dx > dz:
+            rx = -ry - rz
+        elif dy <= dz:
+            rz = -rx - ry
+        return rx, rz
+
+    def point(self, q, r):
+        center_lat = self.size * 1.5 * r
+        center_lon = self.size * (SQRT3 * q + SQRT3 / 2 * r)
+        return round(center_lat, 6), round(center_lon, 6)
+
+
+class GeohashBucketer:
+    """
+    Geohash cells; neighbouring recipients share a prefix of the given length.
+    The cell ID is the geohash's interleaved bits (5 per character).
+    """
+
+    def __init__(self, precision=6):
+        self.precision = int(precision)
+
+    def cell_id(self, lat, lon):
+        lat_range = [-90.0, 90.0]
+        lon_range = [-180.0, 180.0]
+        bits = 0
+        even = True
+
+        for _ in range(self.precision * 5):
+            rng, value = (lon_range, lon) if even else (lat_range, lat)
+            mid = (rng[0] + rng[1]) / 2
+            bits <<= 1
+            if value >= mid:
+                bits |= 1
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+        return bits
+
+    def key_of(self, cell_id):
+        return "".join(
+            GEOHASH_ALPHABET[(cell_id >> shift) & 31]
+            for shift in range((self.precision - 1) * 5, -1, -5)
+        )
+
+    def center_of(self, cell_id):
+        lat_range = [-90.0, 90.0]
+        lon_range = [-180.0, 180.0]
+        even = True
+
+        for shift in range(self.precision * 5 - 1, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (cell_id >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+        return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+BUCKETERS = {
+    "round": RoundBucketer,
+    "geohash": GeohashBucketer,
+    "grid": GridBucketer,
+    "hex": HexBucketer,
+}
+
+
+def get_bucketer(name=None, resolution=None):
+    """Build a bucketer by name, defaulting to LOCATION_BUCKETING/LOCATION_RESOLUTION."""
+    name = name or LOCATION_BUCKETING
+    resolution = resolution if resolution is not None else LOCATION_RESOLUTION
+    if name not in BUCKETERS:
+        raise ValueError(f"Unknown location bucketing: {name}")
+    if resolution in (None, ""):
+        return BUCKETERS[name]()
+    return BUCKETERS[name](resolution)
+
+
+default_bucketer = get_bucketer()
+
+
+def location_cell(lat, lon):
+    """Integer cell ID for a location using the configured bucketing."""
+    return default_bucketer.cell_id(lat, lon)
+
+
+def cell_key(cell_id):
+    """String key for a cell ID (used in messages and the LocationCellIndex table)."""
+    return default_bucketer.key_of(cell_id)
+
+
+def cell_center(cell_id):
+    """Weather lookup coordinates (bucket centre) for a cell ID."""
+    return default_bucketer.center_of(cell_id)
+
+
+def location_key(lat, lon):
+    """String bucket key for a location using the configured bucketing."""
+    return cell_key(location_cell(lat, lon))
@@ -0,0 +1,25 @@
+import json
+import time
+
+# CloudWatch metrics via the Embedded Metric Format: a structured log line that
+# CloudWatch Logs turns into metrics, with no PutMetricData calls from the function.
+METRICS_NAMESPACE = "WeatherAlert"
+
+
+def emit_metrics(function_name, values, unit="Count", namespace=METRICS_NAMESPACE):
+    """Prints one EMF record with a metric per entry in `values`, dimensioned by function."""
+    if not values:
+        return
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": namespace,
+                "Dimensions": [["FunctionName"]],
+                "Metrics": [{"Name": name, "Unit": unit} for name in values],
+            }],
+        },
+        "FunctionName": function_name,
+        **values,
+    }
+    print(json.dumps(record))
@@ -0,0 +1,168 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+# Rate limiting for calls to external providers.
+#
+#   LocalRateLimiter  - spaces calls within one container (threads only)
+#   SharedRateLimiter - one token bucket per provider shared by every container,
+#                       kept in DynamoDB, plus an optional calls-per-day quota
+#
+# The shared bucket is stored as a GCRA "theoretical arrival time" (tat): the
+# time at which the bucket will be full again. Taking a token moves tat forward
+# by one interval, or restarts it from now when the bucket is full. Which of the
+# two conditional writes applies is picked from the last tat this container saw
+# (tat only ever moves forward), so a call with a token available costs one
+# UpdateItem, and a call that has to wait sleeps before writing. Waiters add up
+# to `burst` intervals of random jitter to that sleep, so callers that saw the
+# same tat do not all wake together and race for the one token that is due.
+#
+# Once the daily quota is refused, the limiter remembers the day and refuses
+# further calls in-process, without waiting for or spending a token.
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot be made within the limits (quota spent or wait too long)."""
+
+
+class LocalRateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next_call = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            call_at = max(now, self.next_call)
+            self.next_call = call_at + self.interval
+        if call_at > now:
+            time.sleep(call_at - now)  # nosemgrep: arbitrary-sleep
+
+
+class SharedRateLimiter:
+    """
+    Token bucket shared across invocations through conditional writes to DynamoDB.
+
+    `calls_per_second` refills the bucket, `burst` is its size, and `calls_per_day`
+    (0 = unlimited) caps calls per UTC day. If DynamoDB is unavailable the
+    limiter falls back to `fallback` so calls still stay spaced in-process.
+    """
+
+    def __init__(self, dynamodb_client, table_name, provider, calls_per_second,
+                 calls_per_day=0, burst=1, max_wait_seconds=30, fallback=None):
+        self.dynamodb = dynamodb_client
+        self.table_name = table_name
+        self.provider = provider
+        self.interval = 1.0 / calls_per_second if calls_per_second > 0 else 0
+        self.tolerance = self.interval * max(burst, 1)
+        self.calls_per_day = calls_per_day
+        self.max_wait_seconds = max_wait_seconds
+        self.fallback = fallback or LocalRateLimiter(calls_per_second)
+        self._tat = None  # Last tat seen; a lower bound on the stored one
+        self._spent_day = None  # UTC day whose quota was found used up
+
+    def acquire(self):
+        """Blocks until a call is allowed. Raises RateLimitExceeded when it is not."""
+        if self.calls_per_day and self._spent_day == self._today():
+            raise RateLimitExceeded(f"{self.provider} daily quota of {self.calls_per_day} calls used up")
+        try:
+            # The token first, so a call that is refused for the rate spends no quota
+            if self.interval:
+                self._take_token()
+            if self.calls_per_day:
+                self._take_daily()
+        except RateLimitExceeded:
+            raise
+        except ClientError as e:
+            print(f"[SharedRateLimiter] Falling back to local limiting for {self.provider}: {e}")
+            self.fallback.acquire()
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def _take_daily(self):
+        day = self._today()
+        try:
+            self.dynamodb.update_item(
+                TableName=self.table_name,
+                Key={"state_key": {"S": f"{self.provider}#day#{day}"}},
+                UpdateExpression="ADD calls :one SET expires_at = :expires",
+                ConditionExpression="attribute_not_exists(calls) OR calls < :limit",
+                ExpressionAttributeValues={
+                    ":one": {"N": "1"},
+                    ":limit": {"N": str(self.calls_per_day)},
+                    ":expires": {"N": str(int(time.time()) + 2 * 86400)},
+                },
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            self._spent_day = day
+            raise RateLimitExceeded(f"{self.provider} daily quota of {self.calls_per_day} calls used up")
+
+    def _take_token(self):
+        key = {"state_key": {"S": f"{self.provider}#rate"}}
+        deadline = time.time() + self.max_wait_seconds
+
+        while True:
+            now = time.time()
+            latest = now + self.tolerance - self.interval
+            tat = self._tat
+
+            if tat is not None and tat > latest:
+                # Bucket empty (the stored tat is at least this): wait until a token is due
+                wait = tat - latest + random.uniform(0, self.tolerance)
+                if now + wait > deadline:
+                    raise RateLimitExceeded(f"{self.provider} rate limit wait exceeded {self.max_wait_seconds}s")
+                time.sleep(wait)  # nosemgrep: arbitrary-sleep
+                continue
+
+            expires = {"N": str(int(now) + 86400)}
+            if tat is None or tat < now:
+                # Bucket full: restart it from now
+                request = {
+                    "UpdateExpression": "SET tat = :next, expires_at = :expires",
+                    "ConditionExpression": "attribute_not_exists(tat) OR tat < :now",
+                    "ExpressionAttributeValues": {
+                        ":next": {"N": repr(now + self.interval)},
+                        ":now": {"N": repr(now)},
+                        ":expires": expires,
+                    },
+                }
+            else:
+                # Bucket partly drained: spend a token by moving tat forward
+                request = {
+                    "UpdateExpression": "SET tat = tat + :interval, expires_at = :expires",
+                    "ConditionExpression": "tat BETWEEN :now AND :latest",
+                    "ExpressionAttributeValues": {
+                        ":interval": {"N": repr(self.interval)},
+                        ":now": {"N": repr(now)},
+                        ":latest": {"N": repr(latest)},
+                        ":expires": expires,
+                    },
+                }
+
+            try:
+                response = self.dynamodb.update_item(
+                    TableName=self.table_name,
+                    Key=key,
+                    ReturnValues="UPDATED_NEW",
+                    ReturnValuesOnConditionCheckFailure="ALL_OLD",
+                    **request,
+                )
+                self._tat = float(response["Attributes"]["tat"]["N"])
+                return
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                # Another caller moved tat; retry with the stored value
+                item = e.response.get("Item") or {}
+                self._tat = float(item["tat"]["N"]) if "tat" in item else None
@@ -0,0 +1,125 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# SQS limits for SendMessageBatch
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+
+class SqsBatchPublisher:
+    """
+    Buffers SQS messages and sends them with send_message_batch in groups of 10.
+
+    Batches are flushed concurrently. Entries that fail inside an otherwise
+    successful batch are retried on their own; entries that still fail are
+    returned from flush() so callers can report them per message.
+    """
+
+    def __init__(self, sqs_client, queue_url, max_workers=4, max_attempts=3, auto_flush=True):
+        self.sqs = sqs_client
+        self.queue_url = queue_url
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.auto_flush = auto_flush
+        self.sent = 0
+        self.failures = []
+        self._buffer = []
+        self._next_id = 0
+
+    def publish(self, body, tag=None):
+        """Queue a message (dict or str) for sending. `tag` is echoed back on failure."""
+        if not isinstance(body, str):
+            body = json.dumps(body)
+
+        entry_id = str(self._next_id)
+        self._next_id += 1
+        self._buffer.append({"Id": entry_id, "MessageBody": body, "tag": tag})
+
+        # Flush once there is enough for every worker to send a full batch
+        if self.auto_flush and len(self._buffer) >= MAX_BATCH_ENTRIES * self.max_workers:
+            self.flush()
+        return entry_id
+
+    def flush(self):
+        """Send all buffered messages. Returns the list of failed entries so far."""
+        entries, self._buffer = self._buffer, []
+        batches = list(self._chunk(entries))
+        if not batches:
+            return self.failures
+
+        if len(batches) == 1:
+            results = [self._send_batch(batches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                results = list(pool.map(self._send_batch, batches))
+
+        for sent, failed in results:
+            self.sent += sent
+            self.failures.extend(failed)
+        return self.failures
+
+    def _chunk(self, entries):
+        """Split entries into batches within the SQS entry and payload limits."""
+        batch, size = [], 0
+        for entry in entries:
+            entry_size = len(entry["MessageBody"].encode("utf-8"))
+            if batch and (len(batch) == MAX_BATCH_ENTRIES or size + entry_size > MAX_BATCH_BYTES):
+                yield batch
+                batch, size = [], 0
+            batch.append(entry)
+            size += entry_size
+        if batch:
+            yield batch
+
+    def _send_batch(self, batch):
+        """Send one batch, retrying only the entries SQS reports as failed."""
+        pending = {entry["Id"]: entry for entry in batch}
+        errors = {}
+        failed = []
+        sent = 0
+
+        for attempt in range(self.max_attempts):
+            if not pending:
+                break
+            if attempt:
+                time.sleep(0.1 * 2 ** attempt)  # nosemgrep: arbitrary-sleep
+
+            try:
+                response = self.sqs.send_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {"Id": entry["Id"], "MessageBody": entry["MessageBody"]}
+                        for entry in pending.values()
+                    ]
+                )
+            except Exception as e:
+                for entry_id in pending:
+                    errors[entry_id] = {"Code": type(e).__name__, "Message": str(e)}
+                continue
+
+            sent += len(response.get("Successful", []))
+            retry = {}
+            for failure in response.get("Failed", []):
+                entry = pending[failure["Id"]]
+                errors[failure["Id"]] = failure
+                # Sender faults (bad payload etc.) will not succeed on retry
+                if failure.get("SenderFault"):
+                    failed.append(self._failure(entry, failure))
+                else:
+                    retry[failure["Id"]] = entry
+            pending = retry
+
+        for entry_id, entry in pending.items():
+            failed.append(self._failure(entry, errors.get(entry_id, {})))
+        return sent, failed
+
+    @staticmethod
+    def _failure(entry, error):
+        return {
+            "id": entry["Id"],
+            "tag": entry.get("tag"),
+            "code": error.get("Code"),
+            "message": error.get("Message"),
+            "senderFault": bool(error.get("SenderFault")),
+        }
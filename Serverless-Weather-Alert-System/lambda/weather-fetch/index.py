@@ -4,22 +4,111 @@ import time
 import requests
 import boto3
 import ssl
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from requests.adapters import HTTPAdapter
 from urllib3.util.ssl_ import create_urllib3_context
+from sqs_batch import SqsBatchPublisher
+from cache import TieredCache
+from locations import location_key
+from metrics import emit_metrics
+from rate_limit import LocalRateLimiter, SharedRateLimiter, RateLimitExceeded
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from providers import get_weather_provider
+from rules import load_rules, WindowRule
 
 # Environment variables set by CDK
-TOMORROW_IO_API_KEY = os.environ['TOMORROW_IO_API_KEY']
+TOMORROW_IO_API_KEY = os.environ.get('TOMORROW_IO_API_KEY')
 WEATHER_RESULT_QUEUE_URL = os.environ['WEATHER_RESULT_QUEUE_URL']
 TEMP_THRESHOLD_C = float(os.environ.get('TEMP_THRESHOLD_C', 32))
 
 # Configurable threshold field and operator (for different use cases)
 THRESHOLD_FIELD = os.environ.get('THRESHOLD_FIELD', 'temperature')
-THRESHOLD_OPERATOR = os.environ.get('THRESHOLD_OPERATOR', 'gte')  # gte, lte, eq
+THRESHOLD_OPERATOR = os.environ.get('THRESHOLD_OPERATOR', 'gte')  # gte, gt, lte, lt, eq
+
+# Compound alert rules (see rules.py), replacing the single threshold above when set:
+# one rule, e.g. "temperatureMax >= 32 AND rainAccumulationSum < 5", or a JSON
+# object of per-segment rules keyed by ALERT_SEGMENT_FIELD values, e.g.
+# {"default": "temperatureMax >= 32", "ANC": "temperatureMax >= 30"}
+ALERT_RULES = os.environ.get('ALERT_RULES')
+ALERT_SEGMENT_FIELD = os.environ.get('ALERT_SEGMENT_FIELD', 'anc_pnc_value')
+
+# Optional hourly window rule, alerting in addition to the daily rules, e.g.
+# HOURLY_RULE="temperature >= 32" with HOURLY_WINDOW="12:00-16:00" (local time in
+# ALERT_TIMEZONE). HOURLY_MODE "peak" needs one matching hour in the window,
+# "sustained" needs HOURLY_MIN_HOURS consecutive ones. Hourly values come from
+# the same provider call (and cache entry) as the daily forecast.
+HOURLY_RULE = os.environ.get('HOURLY_RULE')
+HOURLY_WINDOW = os.environ.get('HOURLY_WINDOW', '12:00-16:00')
+HOURLY_MODE = os.environ.get('HOURLY_MODE', 'peak')  # peak, sustained
+HOURLY_MIN_HOURS = int(os.environ.get('HOURLY_MIN_HOURS', 3))
+ALERT_TIMEZONE = os.environ.get('ALERT_TIMEZONE', 'UTC')
+
+# DEMO MODE: Set DEMO_MODE=false for production filtering
+# Enabled for testing - processes all locations regardless of the alert rules
+DEMO_MODE = os.environ.get('DEMO_MODE', 'true').lower() == 'true'
+
+# Forecast source: "tomorrow.io" (one location per request), "open-meteo"
+# (up to PROVIDER_BATCH_POINTS locations per request) or "gridded" (a daily
+# forecast grid at GRID_FORECAST_PATH, a local path or s3:// prefix).
+# PROVIDER_URL overrides the provider's endpoint, e.g. for a self-hosted Open-Meteo instance.
+WEATHER_PROVIDER = os.environ.get('WEATHER_PROVIDER', 'tomorrow.io')
+PROVIDER_BATCH_POINTS = int(os.environ.get('PROVIDER_BATCH_POINTS', 0))  # 0 = provider default
+PROVIDER_URL = os.environ.get('PROVIDER_URL')
+GRID_FORECAST_PATH = os.environ.get('GRID_FORECAST_PATH')
+
+# Slim forecasts: request only the fields the alert rules and messages need,
+# for today only (Tomorrow.io Timelines API), instead of the full multi-day forecast
+SLIM_FORECAST = os.environ.get('SLIM_FORECAST', 'false').lower() == 'true'
+
+# Recipient table, used to load profiles for location messages that carry IDs only
+RECIPIENTS_TABLE_NAME = os.environ.get('RECIPIENTS_TABLE_NAME')
+LOCATION_INDEX_TABLE_NAME = os.environ.get('LOCATION_INDEX_TABLE_NAME')
+INDEX_CELL_ROW = "#cell"  # Sort key of each cell's summary row (see LocationIndexerFn)
+
+# Forecasts are fetched in parallel, bounded by FETCH_CONCURRENCY, while
+# MAX_CALLS_PER_SECOND / MAX_CALLS_PER_DAY cap calls to the provider. With
+# RATE_LIMIT_TABLE_NAME set the limits are shared by every container (token
+# bucket in DynamoDB); otherwise only the per-second limit applies, per container.
+# PROVIDER_RATE_LIMITS overrides them per provider, e.g.
+# {"tomorrow.io": {"perSecond": 3, "perDay": 500, "burst": 1}}
+FETCH_CONCURRENCY = int(os.environ.get('FETCH_CONCURRENCY', 4))
+MAX_CALLS_PER_SECOND = float(os.environ.get('MAX_CALLS_PER_SECOND', 3))  # Tomorrow.io free tier: 3 requests/second
+MAX_CALLS_PER_DAY = int(os.environ.get('MAX_CALLS_PER_DAY', 0))  # 0 = no daily quota
+RATE_LIMIT_TABLE_NAME = os.environ.get('RATE_LIMIT_TABLE_NAME')
+PROVIDER_RATE_LIMITS = json.loads(os.environ.get('PROVIDER_RATE_LIMITS') or '{}')
+
+# Provider failures: each request times out after PROVIDER_TIMEOUT_SECONDS and
+# timeouts, 429s and 5xx are retried up to PROVIDER_MAX_ATTEMPTS times (honouring
+# Retry-After). After CIRCUIT_FAILURE_THRESHOLD consecutive failures the circuit
+# opens for CIRCUIT_OPEN_SECONDS (doubling per failed probe, up to
+# CIRCUIT_MAX_OPEN_SECONDS): no calls are made and records are returned for
+# redelivery once it closes. State is shared via RATE_LIMIT_TABLE_NAME.
+PROVIDER_TIMEOUT_SECONDS = float(os.environ.get('PROVIDER_TIMEOUT_SECONDS', 10))
+PROVIDER_MAX_ATTEMPTS = int(os.environ.get('PROVIDER_MAX_ATTEMPTS', 3))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_OPEN_SECONDS = int(os.environ.get('CIRCUIT_OPEN_SECONDS', 30))
+CIRCUIT_MAX_OPEN_SECONDS = int(os.environ.get('CIRCUIT_MAX_OPEN_SECONDS', 900))
+
+# Forecast cache: in-process LRU plus a shared DynamoDB table, keyed by location
+# cell and forecast date, so retries and reruns on the same day reuse one API call
+CACHE_TABLE_NAME = os.environ.get('CACHE_TABLE_NAME')
+FORECAST_CACHE_TTL_SECONDS = int(os.environ.get('FORECAST_CACHE_TTL_SECONDS', 21600))
+FORECAST_CACHE_MAX_ENTRIES = int(os.environ.get('FORECAST_CACHE_MAX_ENTRIES', 2048))
+
+# Longest visibility timeout SQS accepts (12 hours)
+MAX_VISIBILITY_TIMEOUT = 43200
 
 sqs = boto3.client("sqs")
+dynamodb = boto3.resource("dynamodb")
+dynamodb_client = boto3.client("dynamodb")
 
-# DEMO MODE: Set to False for production filtering
-DEMO_MODE = True  # Enabled for testing - processes all locations regardless of temperature
+# Parsed once per container
+alert_rules = load_rules(ALERT_RULES, ALERT_SEGMENT_FIELD, THRESHOLD_FIELD, THRESHOLD_OPERATOR, TEMP_THRESHOLD_C)
+window_rule = (
+    WindowRule(HOURLY_RULE, HOURLY_WINDOW, HOURLY_MODE, HOURLY_MIN_HOURS, ALERT_TIMEZONE)
+    if HOURLY_RULE else None
+)
 
 # Create a custom SSL context that enforces TLS 1.2+
 class TLSAdapter(HTTPAdapter):
@@ -30,87 +119,362 @@ class TLSAdapter(HTTPAdapter):
         return super().init_poolmanager(*args, **kwargs)
 
 # Create a session with secure TLS configuration
+# The connection pool is sized so concurrent fetches reuse connections instead of opening new ones
 session = requests.Session()
-session.mount('https://', TLSAdapter())
+session.mount('https://', TLSAdapter(pool_connections=1, pool_maxsize=FETCH_CONCURRENCY))
+
+def get_rate_limiter(provider):
+    """Rate limiter for one provider, shared across containers when a table is configured."""
+    limits = PROVIDER_RATE_LIMITS.get(provider, {})
+    calls_per_second = float(limits.get("perSecond", MAX_CALLS_PER_SECOND))
+    if not RATE_LIMIT_TABLE_NAME:
+        return LocalRateLimiter(calls_per_second)
+    return SharedRateLimiter(
+        dynamodb_client,
+        RATE_LIMIT_TABLE_NAME,
+        provider,
+        calls_per_second,
+        calls_per_day=int(limits.get("perDay", MAX_CALLS_PER_DAY)),
+        burst=int(limits.get("burst", 1)),
+    )
+
+provider = get_weather_provider(
+    WEATHER_PROVIDER,
+    session,
+    api_key=TOMORROW_IO_API_KEY,
+    max_batch_points=PROVIDER_BATCH_POINTS,
+    url=PROVIDER_URL,
+    grid_path=GRID_FORECAST_PATH,
+    fields=(alert_rules.fields | {"temperatureMax"}) if SLIM_FORECAST else None,
+    hourly_fields=window_rule.fields if window_rule else None,
+)
+provider.rate_limiter = get_rate_limiter(provider.name)
+provider.timeout = PROVIDER_TIMEOUT_SECONDS
+provider.max_attempts = PROVIDER_MAX_ATTEMPTS
+provider.circuit_breaker = CircuitBreaker(
+    dynamodb_client,
+    RATE_LIMIT_TABLE_NAME,
+    provider.name,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    open_seconds=CIRCUIT_OPEN_SECONDS,
+    max_open_seconds=CIRCUIT_MAX_OPEN_SECONDS,
+)
+
+# Cached values are provider-specific, so each provider gets its own namespace
+forecast_cache = TieredCache(
+    f"forecast#{provider.cache_namespace}#daily",
+    dynamodb_client=dynamodb_client,
+    table_name=CACHE_TABLE_NAME,
+    ttl_seconds=FORECAST_CACHE_TTL_SECONDS,
+    max_entries=FORECAST_CACHE_MAX_ENTRIES,
+)
+
+# Recipients whose results were queued for a location message that then failed
+# (some of its results could not be queued), keyed by SQS message ID, so that the
+# redelivered message only re-sends the rest
+sent_results = TieredCache(
+    "weather-result#sent",
+    dynamodb_client=dynamodb_client,
+    table_name=CACHE_TABLE_NAME,
+    ttl_seconds=86400,
+    max_entries=256,
+)
+
+def forecast_cache_key(msg):
+    """Cache key for a location message: its location cell and forecast date."""
+    cell = msg.get("locationKey") or location_key(msg.get("latitude"), msg.get("longitude"))
+    day = msg.get("todayDate") or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return f"{cell}#{day}"
+
+def fetch_batch(batch):
+    """
+    Requests forecasts for a batch of (cache key, (lat, lon)) pairs in as few
+    provider calls as the provider allows, and caches the results.
+    Returns the daily values for each pair, all None if the request failed.
+    """
+    try:
+        values = provider.get_forecasts([point for _, point in batch])
+    except (RateLimitExceeded, CircuitOpenError) as e:
+        print(f"[WeatherFetchFn] Skipping fetch: {e}")
+        return [None] * len(batch)
+    except Exception as e:
+        print(f"[WeatherFetchFn] Failed to fetch weather data: {e}")
+        return [None] * len(batch)
+
+    print(f"[WeatherFetchFn] Successfully fetched weather data for {len(batch)} location(s)")
+    for (key, _), daily in zip(batch, values):
+        if daily is not None and provider.cacheable:
+            forecast_cache.put(key, daily)
+    return values
+
+def get_forecasts(msgs):
+    """
+    Returns today's daily values for each location message (None where the fetch
+    failed) and the number of provider calls made.
+    Cells already in the forecast cache are not requested; the rest are
+    requested concurrently, several per call where the provider supports it.
+    """
+    keys = [forecast_cache_key(msg) for msg in msgs]
+    workers = max(1, min(FETCH_CONCURRENCY, len(msgs)))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if provider.cacheable:
+            forecasts = dict(zip(keys, pool.map(forecast_cache.get, keys)))
+        else:
+            forecasts = dict.fromkeys(keys)
+
+        # Each uncached cell is requested once, even if several messages share it
+        misses = {}
+        for key, msg in zip(keys, msgs):
+            if forecasts[key] is None and key not in misses:
+                misses[key] = (msg.get("latitude"), msg.get("longitude"))
+
+        pairs = list(misses.items())
+        size = provider.max_batch_points
+        batches = [pairs[start:start + size] for start in range(0, len(pairs), size)]
+        for batch, values in zip(batches, pool.map(fetch_batch, batches)):
+            for (key, _), daily in zip(batch, values):
+                forecasts[key] = daily
+
+    return [forecasts[key] for key in keys], len(batches)
+
+def delay_redelivery(records, seconds):
+    """
+    Keeps failed records invisible until the provider circuit closes, instead of
+    the queue's full visibility timeout, so they are retried as soon as calls resume.
+    """
+    for start in range(0, len(records), 10):
+        chunk = records[start:start + 10]
+        # arn:aws:sqs:<region>:<account>:<queue>
+        _, _, _, region, account, queue = chunk[0]['eventSourceARN'].split(':')
+        try:
+            sqs.change_message_visibility_batch(
+                QueueUrl=f"https://sqs.{region}.amazonaws.com/{account}/{queue}",
+                Entries=[
+                    {"Id": str(i), "ReceiptHandle": record['receiptHandle'], "VisibilityTimeout": seconds}
+                    for i, record in enumerate(chunk)
+                ],
+            )
+        except Exception as e:
+            # The records are still redelivered after the queue's visibility timeout
+            print(f"[WeatherFetchFn] Could not delay redelivery: {e}")
+
+def load_recipients(recipient_ids, today):
+    """
+    Loads recipient profiles with BatchGetItem (100 keys per request).
+    Recipients already alerted today are skipped.
+    """
+    profiles = []
+    for start in range(0, len(recipient_ids), 100):
+        request = {
+            RECIPIENTS_TABLE_NAME: {
+                "Keys": [{"contact_uuid": rid} for rid in recipient_ids[start:start + 100]],
+                "ProjectionExpression": (
+                    "#cid,lastAlertedDate,#lang,anc_pnc_value,medical_conditions,"
+                    "#stat,facility_code,facility_name,phone_number"
+                ),
+                "ExpressionAttributeNames": {
+                    "#cid": "contact_uuid",
+                    "#lang": "language",
+                    "#stat": "status"
+                }
+            }
+        }
+        attempt = 0
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            profiles.extend(response["Responses"].get(RECIPIENTS_TABLE_NAME, []))
+            request = response.get("UnprocessedKeys")
+            if request:
+                # Back off before retrying throttled keys
+                attempt += 1
+                time.sleep(min(0.05 * 2 ** attempt, 1))  # nosemgrep: arbitrary-sleep
+
+    return [p for p in profiles if p.get("lastAlertedDate") != today]
+
+def index_members(loc_key):
+    """Recipient IDs of one LocationCellIndex cell: its partition's rows other than the summary row."""
+    query_kwargs = {
+        "TableName": LOCATION_INDEX_TABLE_NAME,
+        "KeyConditionExpression": "cell = :cell",
+        "ExpressionAttributeValues": {":cell": {"S": loc_key}},
+        "ProjectionExpression": "contact_uuid",
+    }
+    members = []
+    while True:
+        response = dynamodb_client.query(**query_kwargs)
+        members.extend(
+            row["contact_uuid"]["S"] for row in response["Items"]
+            if row["contact_uuid"]["S"] != INDEX_CELL_ROW
+        )
+        if "LastEvaluatedKey" not in response:
+            return members
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+def get_recipients(msg):
+    """
+    Returns the recipients of a location message.
+    Location-grouped messages carry a "recipients" list or "recipientIds" whose
+    profiles are loaded here. Messages read from the location index carry only
+    a "recipientCount"; the cell's member IDs are read from the index first.
+    Older messages carry a single recipient's fields at the top level.
+    """
+    if "recipientCount" in msg:
+        return load_recipients(index_members(msg["locationKey"]), msg.get("todayDate"))
+    if "recipientIds" in msg:
+        return load_recipients(msg["recipientIds"], msg.get("todayDate"))
+    recipients = msg.get("recipients")
+    if recipients is None:
+        return [msg]
+    return recipients
 
 def lambda_handler(event, context):
     """
-    Fetches weather forecasts from Tomorrow.io for queued locations.
-    Filters by temperature threshold (unless DEMO_MODE is True).
+    Fetches weather forecasts from the configured provider for queued locations.
+    Filters recipients by the alert rules for their segment (unless DEMO_MODE is on).
+    Returns the message IDs of records that failed so only those are redelivered.
     """
     records = event['Records']
     total_records = len(records)
     print(f"[WeatherFetchFn] Processing {total_records} location messages")
 
-    # Rate limiting: process max 10 locations per invocation
-    records = records[:10]
     processed = 0
+    recipients_queued = 0
+    failed_ids = set()
+    publisher = SqsBatchPublisher(sqs, WEATHER_RESULT_QUEUE_URL)
 
+    pending = []
+    redelivered = set()
     for record in records:
-        msg = json.loads(record['body'])
-        
+        if int(record.get('attributes', {}).get('ApproximateReceiveCount', 1)) > 1:
+            redelivered.add(record['messageId'])
+        try:
+            pending.append((record['messageId'], json.loads(record['body'])))
+        except Exception as e:
+            print(f"[WeatherFetchFn] Could not parse location message: {e}")
+            failed_ids.add(record['messageId'])
+
+    forecasts, provider_calls = get_forecasts([msg for _, msg in pending])
+    print(
+        f"[WeatherFetchFn] {len(pending)} locations needed {provider_calls} {provider.name} call(s) "
+        f"({len(pending) - provider_calls} saved by caching and batching)"
+    )
+
+    # Evaluate every segment's rule for each forecast of the batch
+    decisions = alert_rules.evaluate_many(forecasts)
+
+    # Contact IDs already sent, and queued in this invocation, per location message
+    already_sent = {}
+    queued = {}
+
+    for (message_id, msg), daily, matches in zip(pending, forecasts, decisions):
         lat = msg.get("latitude")
         lon = msg.get("longitude")
         today = msg.get("todayDate")
 
-        # Build Tomorrow.io API call for daily forecast
-        # Note: API key is not logged for security
-        url = (
-            f"https://api.tomorrow.io/v4/weather/forecast?"
-            f"location={lat},{lon}&apikey={TOMORROW_IO_API_KEY}&timesteps=1d"
-        )
-
-        try:
-            response = session.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            print(f"[WeatherFetchFn] Successfully fetched weather data")
-        except Exception as e:
-            print(f"[WeatherFetchFn] Failed to fetch weather data: {e}")
+        if daily is None:
+            failed_ids.add(message_id)
             continue
 
         try:
-            daily = data["timelines"]["daily"][0]
-            max_temp = float(daily["values"]["temperatureMax"])
+            max_temp = float(daily["temperatureMax"])
         except Exception as e:
             print(f"[WeatherFetchFn] Could not parse forecast: {e}")
+            failed_ids.add(message_id)
             continue
 
-        # Temperature filtering logic
-        # DEMO_MODE: Send all results regardless of temperature
-        # Production: Only send if max_temp >= TEMP_THRESHOLD_C
-        if DEMO_MODE or max_temp >= TEMP_THRESHOLD_C:
-            result_msg = {
-                "latitude": lat,
-                "longitude": lon,
-                "todayDate": today,
-                "temperatureMax": max_temp,
-                "contact_uuid": msg.get("contact_uuid"),
-                "language": msg.get("language", "en"),
-                "anc_pnc_value": msg.get("anc_pnc_value"),
-                "medical_conditions": msg.get("medical_conditions"),
-                "status": msg.get("status"),
-                "facility_code": msg.get("facility_code"),
-                "facility_name": msg.get("facility_name"),
-                "phone_number": msg.get("phone_number"),
-                "lastAlertedDate": msg.get("lastAlertedDate"),
-            }
-            
-            sqs.send_message(
-                QueueUrl=WEATHER_RESULT_QUEUE_URL,
-                MessageBody=json.dumps(result_msg)
-            )
+        # The hourly window rule applies to every segment on top of its daily rule
+        if window_rule and window_rule.matches(daily, today):
+            print(f"[WeatherFetchFn] Hourly window rule matched: {window_rule.description}")
+            matches = dict.fromkeys(matches, True)
+
+        # Alert rule filtering
+        # DEMO_MODE: Send all results regardless of the rules
+        # Production: Only send to recipients whose segment's rule matches this forecast
+        if DEMO_MODE or any(matches.values()):
+            try:
+                recipients = get_recipients(msg)
+            except Exception as e:
+                print(f"[WeatherFetchFn] Failed to load recipients: {e}")
+                failed_ids.add(message_id)
+                continue
+
+            if message_id in redelivered:
+                already_sent[message_id] = set(sent_results.get(message_id) or [])
+            sent_before = already_sent.get(message_id, ())
+            queued[message_id] = []
+
+            # Fan the forecast out to every recipient at this location
+            for recipient in recipients:
+                if not DEMO_MODE and not matches[alert_rules.segment_of(recipient)]:
+                    continue
+                contact_uuid = recipient.get("contact_uuid")
+                if contact_uuid and contact_uuid in sent_before:
+                    continue
+                result_msg = {
+                    "latitude": lat,
+                    "longitude": lon,
+                    "todayDate": today,
+                    "temperatureMax": max_temp,
+                    "contact_uuid": contact_uuid,
+                    "language": recipient.get("language", "en"),
+                    "anc_pnc_value": recipient.get("anc_pnc_value"),
+                    "medical_conditions": recipient.get("medical_conditions"),
+                    "status": recipient.get("status"),
+                    "facility_code": recipient.get("facility_code"),
+                    "facility_name": recipient.get("facility_name"),
+                    "phone_number": recipient.get("phone_number"),
+                    "lastAlertedDate": recipient.get("lastAlertedDate"),
+                }
+                
+                # Tag each result with its source record and recipient so a failed send
+                # fails that record, and only that recipient is re-sent on redelivery
+                publisher.publish(result_msg, tag=(message_id, contact_uuid))
+                queued[message_id].append(contact_uuid)
+                recipients_queued += 1
             
             print(f"[WeatherFetchFn] Severe weather event detected and queued")
             processed += 1
 
-        # Rate limiting: Tomorrow.io free tier allows 500 calls/day
-        # Sleep prevents hitting rate limits when processing multiple locations
-        # NOTE: If SMS sending to Africa's Talking fails due to rate limits, uncomment the line below
-        # time.sleep(0.5)  # nosemgrep: arbitrary-sleep
+    unsent = {}
+    for failure in publisher.flush():
+        print(f"[WeatherFetchFn] Failed to queue weather result: {failure['code']} {failure['message']}")
+        message_id, contact_uuid = failure['tag']
+        failed_ids.add(message_id)
+        unsent.setdefault(message_id, set()).add(contact_uuid)
+
+    # Remember who was sent before failing a record, so its redelivery skips them
+    for message_id, contacts in unsent.items():
+        sent = already_sent.get(message_id, set()) | {c for c in queued[message_id] if c and c not in contacts}
+        if sent:
+            sent_results.put(message_id, sorted(sent))
+
+    cache_stats = forecast_cache.stats(reset=True)
+    print(f"[WeatherFetchFn] Forecast cache: {cache_stats}")
+    emit_metrics("WeatherFetchFn", {
+        "ForecastCacheHits": cache_stats["hits"],
+        "ForecastCacheSharedHits": cache_stats["sharedHits"],
+        "ForecastCacheMisses": cache_stats["misses"],
+        "ProviderCalls": provider_calls,
+        "ProviderCallsSaved": len(pending) - provider_calls,
+    })
+
+    if failed_ids:
+        print(f"[WeatherFetchFn] {len(failed_ids)} of {total_records} location messages failed and will be retried")
+        retry_in = provider.circuit_breaker.retry_in()
+        if retry_in > 0:
+            print(f"[WeatherFetchFn] {provider.name} circuit open, retrying failed messages in {retry_in:.0f}s")
+            delay = min(int(retry_in) + 1, MAX_VISIBILITY_TIMEOUT)
+            delay_redelivery([r for r in records if r['messageId'] in failed_ids], delay)
 
     return {
         "statusCode": 200,
         "processed_locations": processed,
-        "original_messages": total_records
+        "recipients_queued": recipients_queued,
+        "original_messages": total_records,
+        # Partial batch response (reportBatchItemFailures): only these records are redelivered
+        "batchItemFailures": [
+            {"itemIdentifier": record['messageId']}
+            for record in records if record['messageId'] in failed_ids
+        ],
     }
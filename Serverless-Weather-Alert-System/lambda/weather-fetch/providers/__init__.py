@@ -0,0 +1,31 @@
+import boto3
+from providers.base import WeatherProvider
+from providers.tomorrow_io import TomorrowIoProvider
+from providers.open_meteo import OpenMeteoProvider
+from providers.gridded import GriddedProvider
+
+
+def get_weather_provider(name, session, rate_limiter=None, **options):
+    """Build the provider selected by WEATHER_PROVIDER."""
+    if name in ("tomorrow.io", "tomorrow_io"):
+        return TomorrowIoProvider(
+            options["api_key"],
+            session,
+            rate_limiter,
+            fields=options.get("fields"),
+            hourly_fields=options.get("hourly_fields"),
+        )
+    if name in ("open-meteo", "open_meteo"):
+        return OpenMeteoProvider(
+            session,
+            rate_limiter,
+            max_batch_points=options.get("max_batch_points") or 100,
+            url=options.get("url"),
+            hourly_fields=options.get("hourly_fields"),
+        )
+    if name == "gridded":
+        path = options.get("grid_path")
+        if not path:
+            raise ValueError("GRID_FORECAST_PATH must be set for the gridded provider")
+        return GriddedProvider(path, s3_client=boto3.client("s3") if path.startswith("s3://") else None)
+    raise ValueError(f"Unknown weather provider: {name}")
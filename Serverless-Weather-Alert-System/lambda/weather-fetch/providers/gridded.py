@@ -0,0 +1,99 @@
+import json
+import os
+from providers.base import WeatherProvider
+
+# Gridded daily forecast read from files instead of a per-location API.
+#
+# A grid directory holds one regular lat/lon grid:
+#   grid.json      {"issued": "...", "lat0": -5.0, "lon0": 33.5, "dlat": 0.1,
+#                   "dlon": 0.1, "shape": [rows, cols],
+#                   "fields": ["temperatureMax", ...]}
+#   <field>.npy    2-D float array of shape [rows, cols], NaN where missing
+#
+# lat0/lon0 are the centre of cell [0, 0]. Arrays are memory-mapped, so a
+# lookup only pages in the cells it touches; all points of a batch are looked
+# up in one vectorized pass. GRIB/NetCDF forecasts are converted to this
+# layout upstream (see CUSTOMIZATION.md).
+
+
+class GriddedProvider(WeatherProvider):
+    """Daily values looked up in a memory-mapped forecast grid (local path or s3:// prefix)."""
+
+    name = "gridded"
+    max_batch_points = 100000
+    cacheable = False  # Lookups are local; caching them would only add latency
+
+    def __init__(self, path, s3_client=None, cache_dir="/tmp/forecast-grid"):
+        super().__init__(session=None)
+        self.path = path
+        self.s3 = s3_client
+        self.cache_dir = cache_dir
+        self.meta = None
+        self.arrays = {}
+        self._etag = None
+
+    def get_forecast(self, lat, lon):
+        return self.get_forecasts([(lat, lon)])[0]
+
+    def get_forecasts(self, points):
+        import numpy as np  # Only needed by this provider
+
+        meta, arrays = self._load()
+        rows_total, cols_total = meta["shape"]
+        lats = np.fromiter((float(lat) for lat, _ in points), dtype=np.float64, count=len(points))
+        lons = np.fromiter((float(lon) for _, lon in points), dtype=np.float64, count=len(points))
+
+        rows = np.rint((lats - meta["lat0"]) / meta["dlat"]).astype(np.int64)
+        cols = np.rint((lons - meta["lon0"]) / meta["dlon"]).astype(np.int64)
+        inside = (rows >= 0) & (rows < rows_total) & (cols >= 0) & (cols < cols_total)
+
+        values = {}
+        for field, array in arrays.items():
+            column = np.full(len(points), np.nan)
+            column[inside] = array[rows[inside], cols[inside]]
+            values[field] = column.tolist()
+
+        forecasts = []
+        for i in range(len(points)):
+            daily = {field: column[i] for field, column in values.items() if column[i] == column[i]}
+            # Points outside the grid (or with no data) fail like a failed API call
+            forecasts.append(daily or None)
+        return forecasts
+
+    def _load(self):
+        """Opens the grid, re-opening it when a newer one has been published."""
+        import numpy as np
+
+        local_dir = self._sync() if self.path.startswith("s3://") else self.path
+        with open(os.path.join(local_dir, "grid.json")) as f:
+            meta = json.load(f)
+
+        if meta != self.meta:
+            self.arrays = {
+                field: np.load(os.path.join(local_dir, f"{field}.npy"), mmap_mode="r")
+                for field in meta["fields"]
+            }
+            self.meta = meta
+            print(f"[GriddedProvider] Opened grid issued {meta.get('issued')} {meta['shape']}")
+        return self.meta, self.arrays
+
+    def _sync(self):
+        """Downloads the grid from S3 to local storage when its grid.json has changed."""
+        bucket, _, prefix = self.path[len("s3://"):].partition("/")
+        prefix = prefix.rstrip("/")
+        etag = self.s3.head_object(Bucket=bucket, Key=f"{prefix}/grid.json")["ETag"]
+        if etag == self._etag:
+            return self.cache_dir
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.s3.download_file(bucket, f"{prefix}/grid.json", os.path.join(self.cache_dir, "grid.json.new"))
+        with open(os.path.join(self.cache_dir, "grid.json.new")) as f:
+            fields = json.load(f)["fields"]
+        for field in fields:
+            # Replace arrays atomically so open memory maps keep their old file
+            target = os.path.join(self.cache_dir, f"{field}.npy")
+            self.s3.download_file(bucket, f"{prefix}/{field}.npy", target + ".new")
+            os.replace(target + ".new", target)
+        os.replace(os.path.join(self.cache_dir, "grid.json.new"), os.path.join(self.cache_dir, "grid.json"))
+        self._etag = etag
+        return self.cache_dir
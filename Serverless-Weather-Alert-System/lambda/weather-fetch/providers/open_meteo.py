@@ -0,0 +1,82 @@
+from providers.base import WeatherProvider
+
+# Open-Meteo daily variables and the Tomorrow.io field names they map to
+DAILY_FIELDS = {
+    "temperature_2m_max": "temperatureMax",
+    "temperature_2m_min": "temperatureMin",
+    "apparent_temperature_max": "temperatureApparentMax",
+    "relative_humidity_2m_max": "humidityMax",
+    "precipitation_sum": "rainAccumulationSum",
+    "precipitation_probability_max": "precipitationProbabilityMax",
+    "wind_speed_10m_max": "windSpeedMax",
+    "uv_index_max": "uvIndexMax",
+}
+
+# Open-Meteo hourly variables and the Tomorrow.io hourly field names they map to
+HOURLY_FIELDS = {
+    "temperature_2m": "temperature",
+    "apparent_temperature": "temperatureApparent",
+    "relative_humidity_2m": "humidity",
+    "precipitation": "rainIntensity",
+    "wind_speed_10m": "windSpeed",
+    "uv_index": "uvIndex",
+}
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """
+    Open-Meteo daily forecast. Accepts comma-separated coordinate lists, so one
+    request covers up to `max_batch_points` locations. Hourly values, when
+    requested, come from the same request.
+    """
+
+    name = "open-meteo"
+    url = "https://api.open-meteo.com/v1/forecast"
+
+    def __init__(self, session, rate_limiter=None, timeout=10, max_batch_points=100, url=None, hourly_fields=None):
+        super().__init__(session, rate_limiter, timeout)
+        self.max_batch_points = max_batch_points
+        if url:
+            self.url = url
+        self.hourly_fields = sorted(hourly_fields) if hourly_fields else None
+        self.hourly_variables = {
+            variable: field for variable, field in HOURLY_FIELDS.items()
+            if field in (self.hourly_fields or ())
+        }
+
+    def get_forecast(self, lat, lon):
+        return self.get_forecasts([(lat, lon)])[0]
+
+    def get_forecasts(self, points):
+        params = {
+            "latitude": ",".join(str(lat) for lat, _ in points),
+            "longitude": ",".join(str(lon) for _, lon in points),
+            "daily": ",".join(DAILY_FIELDS),
+            "wind_speed_unit": "ms",
+            "timezone": "GMT",
+            "forecast_days": 1,
+        }
+        if self.hourly_variables:
+            # Two days so a local-time window late in the UTC day is covered
+            params.update(hourly=",".join(self.hourly_variables), forecast_days=2)
+        data = self._get_json(self.url, params)
+        # A single location comes back as an object, several as a list in request order
+        results = data if isinstance(data, list) else [data]
+        if len(results) != len(points):
+            raise ValueError(f"Expected {len(points)} forecasts, got {len(results)}")
+
+        forecasts = []
+        for result in results:
+            daily = {
+                field: result["daily"][variable][0]
+                for variable, field in DAILY_FIELDS.items()
+                if result["daily"].get(variable) and result["daily"][variable][0] is not None
+            }
+            if self.hourly_variables:
+                hourly = result["hourly"]
+                daily["hourly"] = [
+                    {"time": time, **{field: hourly[variable][i] for variable, field in self.hourly_variables.items()}}
+                    for i, time in enumerate(hourly["time"])
+                ]
+            forecasts.append(daily)
+        return forecasts
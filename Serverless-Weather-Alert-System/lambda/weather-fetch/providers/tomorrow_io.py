@@ -0,0 +1,64 @@
+from providers.base import WeatherProvider
+
+
+class TomorrowIoProvider(WeatherProvider):
+    """
+    Tomorrow.io daily forecast, one location per request.
+
+    With `fields` set, the slim Timelines API is used instead of the forecast
+    API: only those daily fields, for today only, are requested, instead of
+    every field for the next several days.
+
+    With `hourly_fields` set, daily and hourly timesteps come from one forecast
+    API request; only the next 24 hours of those hourly fields are kept.
+    """
+
+    name = "tomorrow.io"
+    url = "https://api.tomorrow.io/v4/weather/forecast"
+    timelines_url = "https://api.tomorrow.io/v4/timelines"
+
+    def __init__(self, api_key, session, rate_limiter=None, timeout=10, fields=None, hourly_fields=None):
+        super().__init__(session, rate_limiter, timeout)
+        self.api_key = api_key
+        self.fields = sorted(fields) if fields else None
+        self.hourly_fields = sorted(hourly_fields) if hourly_fields else None
+
+    @property
+    def cache_namespace(self):
+        if self.fields and not self.hourly_fields:
+            return f"{self.name}#slim#{','.join(self.fields)}"
+        return super().cache_namespace
+
+    def get_forecast(self, lat, lon):
+        # Note: API key is not logged for security
+        if self.hourly_fields:
+            data = self._get_json(self.url, {
+                "location": f"{lat},{lon}",
+                "apikey": self.api_key,
+                "timesteps": "1h,1d",
+            })
+            daily = dict(data["timelines"]["daily"][0]["values"])
+            daily["hourly"] = [
+                {"time": hour["time"], **{field: hour["values"].get(field) for field in self.hourly_fields}}
+                for hour in data["timelines"]["hourly"][:24]
+            ]
+            return daily
+
+        if self.fields:
+            data = self._get_json(self.timelines_url, {
+                "location": f"{lat},{lon}",
+                "apikey": self.api_key,
+                "fields": ",".join(self.fields),
+                "timesteps": "1d",
+                "startTime": "now",
+                "endTime": "nowPlus1d",
+                "units": "metric",
+            })
+            return data["data"]["timelines"][0]["intervals"][0]["values"]
+
+        data = self._get_json(self.url, {
+            "location": f"{lat},{lon}",
+            "apikey": self.api_key,
+            "timesteps": "1d",
+        })
+        return data["timelines"]["daily"][0]["values"]
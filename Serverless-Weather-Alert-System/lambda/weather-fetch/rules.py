@@ -0,0 +1,272 @@
+import json
+import math
+import operator
+import re
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+# Alert rules over a location's daily forecast values.
+#
+# A rule is a compound condition such as
+#   temperatureMax >= 32 AND (rainAccumulationSum < 5 OR windSpeedMax >= 11)
+# using AND, OR, NOT, parentheses and the comparisons >= > <= < == !=.
+# Fields are forecast value names (temperatureMax, rainAccumulationSum, ...)
+# or one of the short aliases below. A comparison on a missing (or NaN) value is false.
+#
+# Rules are parsed once (at cold start) into closures, then evaluated per
+# forecast. Forecasts arrive as one dict per location and a batch holds only a
+# few of them, so building columns for a vectorized pass would cost more than
+# it saves.
+#
+# Window rules apply a condition to hourly values instead, e.g. "temperature
+# >= 32 at any hour between 12:00 and 16:00" (peak) or "for 3 consecutive
+# hours" (sustained). The hourly series is read as a stream, one hour at a time.
+
+FIELD_ALIASES = {
+    "temperature": "temperatureMax",
+    "temperature_min": "temperatureMin",
+    "rainfall": "rainAccumulationSum",
+    "rain": "rainAccumulationSum",
+    "wind_speed": "windSpeedMax",
+    "humidity": "humidityMax",
+    "uv_index": "uvIndexMax",
+}
+
+# Hourly value names (Tomorrow.io hourly fields) for window rules
+HOURLY_FIELD_ALIASES = {
+    "temperature": "temperature",
+    "feels_like": "temperatureApparent",
+    "rainfall": "rainIntensity",
+    "rain": "rainIntensity",
+    "wind_speed": "windSpeed",
+    "humidity": "humidity",
+    "uv_index": "uvIndex",
+}
+
+OPERATORS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# THRESHOLD_OPERATOR names used by the single-threshold configuration
+OPERATOR_NAMES = {"gte": ">=", "gt": ">", "lte": "<=", "lt": "<", "eq": "=="}
+
+TOKEN = re.compile(r"\s*(?:(\(|\))|(>=|<=|==|!=|>|<)|(-?\d+(?:\.\d+)?)|([A-Za-z_][A-Za-z0-9_]*))")
+
+DEFAULT_SEGMENT = "default"
+
+
+class RuleError(ValueError):
+    """Raised for a rule that cannot be parsed."""
+
+
+def tokenize(text, aliases=FIELD_ALIASES):
+    tokens, pos = [], 0
+    text = text.strip()
+    while pos < len(text):
+        match = TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise RuleError(f"Unexpected input at {pos} in rule: {text!r}")
+        paren, op, number, word = match.groups()
+        if paren:
+            tokens.append(("paren", paren))
+        elif op:
+            tokens.append(("op", op))
+        elif number:
+            tokens.append(("number", float(number)))
+        elif word.upper() in ("AND", "OR", "NOT"):
+            tokens.append(("keyword", word.upper()))
+        else:
+            tokens.append(("field", aliases.get(word, word)))
+        pos = match.end()
+    return tokens
+
+
+class Parser:
+    """Recursive-descent parser producing a tree of ("or"|"and", [...]), ("not", x), ("cmp", field, op, value)."""
+
+    def __init__(self, text, aliases=FIELD_ALIASES):
+        self.text = text
+        self.tokens = tokenize(text, aliases)
+        self.pos = 0
+
+    def parse(self):
+        node = self.expression()
+        if self.pos != len(self.tokens):
+            raise RuleError(f"Unexpected {self.tokens[self.pos][1]!r} in rule: {self.text!r}")
+        return node
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind, value=None):
+        token = self.peek()
+        if token[0] != kind or (value is not None and token[1] != value):
+            raise RuleError(f"Expected {value or kind} in rule: {self.text!r}")
+        self.pos += 1
+        return token[1]
+
+    def expression(self):
+        terms = [self.term()]
+        while self.peek() == ("keyword", "OR"):
+            self.pos += 1
+            terms.append(self.term())
+        return terms[0] if len(terms) == 1 else ("or", terms)
+
+    def term(self):
+        factors = [self.factor()]
+        while self.peek() == ("keyword", "AND"):
+            self.pos += 1
+            factors.append(self.factor())
+        return factors[0] if len(factors) == 1 else ("and", factors)
+
+    def factor(self):
+        if self.peek() == ("keyword", "NOT"):
+            self.pos += 1
+            return ("not", self.factor())
+        if self.peek() == ("paren", "("):
+            self.pos += 1
+            node = self.expression()
+            self.take("paren", ")")
+            return node
+        field = self.take("field")
+        op = self.take("op")
+        value = self.take("number")
+        return ("cmp", field, op, value)
+
+
+def compile_record(node):
+    """Compile a rule tree into a function of one forecast dict."""
+    kind = node[0]
+    if kind == "cmp":
+        _, field, op, value = node
+        compare = OPERATORS[op]
+
+        def test(daily):
+            current = daily.get(field)
+            if current is None:
+                return False
+            current = float(current)
+            return not math.isnan(current) and compare(current, value)
+        return test
+    if kind == "not":
+        inner = compile_record(node[1])
+        return lambda daily: not inner(daily)
+    parts = [compile_record(child) for child in node[1]]
+    if kind == "and":
+        return lambda daily: all(part(daily) for part in parts)
+    return lambda daily: any(part(daily) for part in parts)
+
+
+def rule_fields(node):
+    if node[0] == "cmp":
+        return {node[1]}
+    if node[0] == "not":
+        return rule_fields(node[1])
+    return set().union(*(rule_fields(child) for child in node[1]))
+
+
+class Rule:
+    """One compiled alert rule."""
+
+    def __init__(self, text, aliases=FIELD_ALIASES):
+        self.text = text
+        self.tree = Parser(text, aliases).parse()
+        self.fields = rule_fields(self.tree)
+        self.matches = compile_record(self.tree)
+
+    def matches_many(self, forecasts):
+        """Evaluate the rule for a list of forecast dicts (None = no forecast)."""
+        matches = self.matches
+        return [bool(daily) and matches(daily) for daily in forecasts]
+
+
+class RuleSet:
+    """
+    Alert rules per recipient segment. A recipient's segment is the value of
+    `segment_field` in their profile (case-insensitive); recipients whose
+    segment has no rule of its own use the "default" rule.
+    """
+
+    def __init__(self, rules, segment_field=None):
+        self.rules = {segment.upper(): Rule(text) for segment, text in rules.items()}
+        self.default = self.rules.get(DEFAULT_SEGMENT.upper())
+        if self.default is None:
+            raise RuleError("A default rule is required")
+        self.segment_field = segment_field
+        self.fields = set().union(*(rule.fields for rule in self.rules.values()))
+
+    def segment_of(self, recipient):
+        if not self.segment_field:
+            return DEFAULT_SEGMENT.upper()
+        segment = str(recipient.get(self.segment_field) or "").upper()
+        return segment if segment in self.rules else DEFAULT_SEGMENT.upper()
+
+    def evaluate_many(self, forecasts):
+        """For each forecast, a dict of segment -> whether that segment's rule matches."""
+        results = {segment: rule.matches_many(forecasts) for segment, rule in self.rules.items()}
+        return [
+            {segment: matches[i] for segment, matches in results.items()}
+            for i in range(len(forecasts))
+        ]
+
+
+class WindowRule:
+    """
+    A condition on hourly values within a daily local-time window.
+
+    mode "peak" matches if any hour in the window meets the condition;
+    "sustained" needs at least `min_hours` consecutive hours meeting it.
+    Forecasts carry their hourly series under "hourly" as a list of
+    {"time": ISO-8601, <field>: value, ...}; times without a zone are UTC.
+    """
+
+    def __init__(self, text, window, mode="peak", min_hours=1, tz="UTC"):
+        if mode not in ("peak", "sustained"):
+            raise RuleError(f"Unknown window mode: {mode}")
+        self.rule = Rule(text, HOURLY_FIELD_ALIASES)
+        self.fields = self.rule.fields
+        self.mode = mode
+        self.min_hours = max(int(min_hours), 1) if mode == "sustained" else 1
+        self.tz = ZoneInfo(tz)
+        try:
+            start, end = window.split("-")
+            self.start_hour = int(start.split(":")[0])
+            self.end_hour = int(end.split(":")[0])
+        except ValueError:
+            raise RuleError(f"Window must look like 12:00-16:00, got {window!r}")
+        self.description = f"{text} ({mode}, {self.start_hour:02d}:00-{self.end_hour:02d}:00 {tz})"
+
+    def matches(self, forecast, day):
+        """Whether the window on local date `day` (YYYY-MM-DD) meets the rule."""
+        day = day or datetime.now(self.tz).strftime("%Y-%m-%d")
+        run = 0
+        for hour in (forecast or {}).get("hourly") or ():
+            when = datetime.fromisoformat(hour["time"].replace("Z", "+00:00"))
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            local = when.astimezone(self.tz)
+            if local.strftime("%Y-%m-%d") != day or not self.start_hour <= local.hour < self.end_hour:
+                continue
+            run = run + 1 if self.rule.matches(hour) else 0
+            if run >= self.min_hours:
+                return True
+        return False
+
+
+def load_rules(alert_rules, segment_field, threshold_field, threshold_operator, threshold):
+    """
+    Build the rule set from ALERT_RULES: a single rule, or a JSON object of
+    segment -> rule with a "default" entry. Without ALERT_RULES the single
+    THRESHOLD_FIELD / THRESHOLD_OPERATOR / TEMP_THRESHOLD_C rule is used.
+    """
+    if not alert_rules:
+        op = OPERATOR_NAMES.get(threshold_operator, threshold_operator)
+        return RuleSet({DEFAULT_SEGMENT: f"{threshold_field} {op} {threshold}"})
+    if alert_rules.lstrip().startswith("{"):
+        return RuleSet(json.loads(alert_rules), segment_field)
+    return RuleSet({DEFAULT_SEGMENT: alert_rules})
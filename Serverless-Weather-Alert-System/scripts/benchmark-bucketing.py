@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Unique weather calls and throughput of the location bucketers on synthetic coordinates.
+Usage: python benchmark-bucketing.py [<coordinates>] [<locations>]
+Example: python benchmark-bucketing.py 1000000 50000
+
+For each bucketing in CONFIGS, assigns every coordinate a cell ID with:
+  scalar     - the shared layer's bucketer, one coordinate at a time, as
+               RecipientsToLocationsFn does while it reads scan pages
+  vectorized - the same arithmetic on NumPy arrays (needs numpy; skipped
+               otherwise), checked to give identical cell IDs
+
+and reports the unique cells (one weather call each), the reduction against
+one call per recipient and against the original 3-decimal rounding, and
+coordinates per second for both paths. No AWS access needed.
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'shared', 'python'))
+import locations  # noqa: E402
+from synthetic_profiles import coordinates  # noqa: E402
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_COORDINATES = 1000000
+DEFAULT_LOCATIONS = 50000
+CONFIGS = (
+    ('round', '3'),
+    ('round', '2'),
+    ('geohash', '6'),
+    ('geohash', '5'),
+    ('grid', '0.1'),
+    ('grid', '0.25'),
+    ('hex', '0.05'),
+)
+
+def pack_arrays(i, j):
+    offset = np.int64(locations.PACK_OFFSET)
+    return ((i.astype(np.int64) + offset).astype(np.uint64) << np.uint64(32)) | (j.astype(np.int64) + offset).astype(np.uint64)
+
+def vector_cell_ids(bucketer, lat, lon):
+    """NumPy version of bucketer.cell_id over arrays of coordinates."""
+    if isinstance(bucketer, locations.RoundBucketer):
+        return pack_arrays(np.rint(lat * bucketer.scale), np.rint(lon * bucketer.scale))
+    if isinstance(bucketer, locations.GridBucketer):
+        return pack_arrays(
+            np.rint((lat - bucketer.origin_lat) / bucketer.step),
+            np.rint((lon - bucketer.origin_lon) / bucketer.step),
+        )
+    if isinstance(bucketer, locations.HexBucketer):
+        x = (locations.SQRT3 / 3 * lon - lat / 3) / bucketer.size
+        z = (2 / 3 * lat) / bucketer.size
+        y = -x - z
+        rx, ry, rz = np.rint(x), np.rint(y), np.rint(z)
+        dx, dy, dz = np.abs(rx - x), np.abs(ry - y), np.abs(rz - z)
+        fix_x = (dx > dy) & (dx > dz)
+        fix_z = ~fix_x & (dy <= dz)
+        rx = np.where(fix_x, -ry - rz, rx)
+        rz = np.where(fix_z, -rx - ry, rz)
+        return pack_arrays(rx, rz)
+    # Geohash: interleave one bisection bit per step, longitude first
+    bits = np.zeros(len(lat), dtype=np.uint64)
+    ranges = {
+        'lon': [np.full(len(lon), -180.0), np.full(len(lon), 180.0), lon],
+        'lat': [np.full(len(lat), -90.0), np.full(len(lat), 90.0), lat],
+    }
+    for step in range(bucketer.precision * 5):
+        low, high, value = ranges['lon' if step % 2 == 0 else 'lat']
+        mid = (low + high) / 2
+        upper = value >= mid
+        bits = (bits << np.uint64(1)) | upper.astype(np.uint64)
+        np.copyto(low, mid, where=upper)
+        np.copyto(high, mid, where=~upper)
+    return bits
+
+def scalar_run(bucketer, points):
+    started = time.perf_counter()
+    cell_id = bucketer.cell_id
+    cells = [cell_id(lat, lon) for lat, lon in points]
+    return cells, time.perf_counter() - started
+
+def vector_run(bucketer, lat, lon):
+    started = time.perf_counter()
+    cells = vector_cell_ids(bucketer, lat, lon)
+    return cells, time.perf_counter() - started
+
+def main(count, location_count):
+    print(f"Bucketing {count} coordinates around {location_count} settlements")
+    points = list(coordinates(count, location_count))
+    if np is not None:
+        lat = np.fromiter((p[0] for p in points), dtype=np.float64, count=count)
+        lon = np.fromiter((p[1] for p in points), dtype=np.float64, count=count)
+    else:
+        print("numpy is not installed: vectorized timings are skipped")
+
+    print(f"\n{'bucketing':<14}{'cells':>9}{'vs rows':>9}{'vs round 3':>12}{'scalar/s':>12}{'vector/s':>12}")
+    baseline = None
+    for name, resolution in CONFIGS:
+        bucketer = locations.get_bucketer(name, resolution)
+        cells, scalar_seconds = scalar_run(bucketer, points)
+        unique = len(set(cells))
+        baseline = baseline or unique
+
+        vector_rate = '-'
+        if np is not None:
+            vector_cells, vector_seconds = vector_run(bucketer, lat, lon)
+            if vector_cells.tolist() != cells:
+                raise SystemExit(f"{name} {resolution}: vectorized cell IDs differ from the scalar ones")
+            vector_rate = f"{count / vector_seconds:.0f}"
+
+        print(f"{name + ' ' + resolution:<14}{unique:>9}{1 - unique / count:>9.1%}{1 - unique / baseline:>12.1%}"
+              f"{count / scalar_seconds:>12.0f}{vector_rate:>12}")
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) > 2 or not all(arg.isdigit() for arg in args):
+        print("Usage: python benchmark-bucketing.py [<coordinates>] [<locations>]")
+        sys.exit(1)
+    main(
+        int(args[0]) if args else DEFAULT_COORDINATES,
+        int(args[1]) if len(args) > 1 else DEFAULT_LOCATIONS,
+    )
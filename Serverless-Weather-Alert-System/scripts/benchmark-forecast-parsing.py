@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Bytes and parse time per location for Tomorrow.io full vs slim forecasts.
+Usage: python benchmark-forecast-parsing.py [<locations>]
+Example: python benchmark-forecast-parsing.py 2000
+
+Runs TomorrowIoProvider.get_forecast over the response fixtures in
+tests/fixtures, through a stub session that parses the body with json.loads
+the way requests does:
+  full - forecast API, every field and timestep (SLIM_FORECAST=false)
+  slim - Timelines API with fields=humidityMax,temperatureMax, today only
+
+Bytes are reported as sent (JSON) and gzipped (what the API transfers when
+requests asks for gzip, as it does by default). No network access needed.
+"""
+
+import sys
+import os
+import gzip
+import json
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [
+    os.path.join(ROOT, 'lambda', 'weather-fetch'),
+    os.path.join(ROOT, 'lambda', 'shared', 'python'),
+]
+from providers.tomorrow_io import TomorrowIoProvider  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+DEFAULT_LOCATIONS = 2000
+MODES = {
+    'full': ('tomorrow_io_forecast.json', None),
+    'slim': ('tomorrow_io_timelines_slim.json', {'temperatureMax', 'humidityMax'}),
+}
+
+class RecordedResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+    def raise_for_status(self):
+        pass
+
+class RecordedSession:
+    def __init__(self, body):
+        self.response = RecordedResponse(body)
+
+    def get(self, url, params=None, timeout=None):
+        return self.response
+
+def benchmark(fixture, fields, locations):
+    with open(os.path.join(FIXTURES, fixture), 'rb') as f:
+        body = f.read()
+    provider = TomorrowIoProvider('key', RecordedSession(body), fields=fields)
+
+    started = time.perf_counter()
+    for _ in range(locations):
+        provider.get_forecast(-1.286, 36.817)
+    elapsed = time.perf_counter() - started
+    return len(body), len(gzip.compress(body)), elapsed * 1000 / locations
+
+def main(locations):
+    print(f"Parsing {locations} forecasts per mode\n")
+    print(f"{'mode':<8}{'bytes/location':>16}{'gzipped':>10}{'ms/location':>13}")
+    results = {}
+    for mode, (fixture, fields) in MODES.items():
+        results[mode] = benchmark(fixture, fields, locations)
+        raw, zipped, ms = results[mode]
+        print(f"{mode:<8}{raw:>16}{zipped:>10}{ms:>13.4f}")
+
+    full, slim = results['full'], results['slim']
+    print(f"\nslim: {full[0] / slim[0]:.0f}x fewer bytes ({full[1] / slim[1]:.0f}x gzipped), "
+          f"{full[2] / slim[2]:.0f}x less parse time per location")
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and not sys.argv[1].isdigit()):
+        print("Usage: python benchmark-forecast-parsing.py [<locations>]")
+        sys.exit(1)
+    main(int(sys.argv[1]) if len(sys.argv) == 2 else DEFAULT_LOCATIONS)
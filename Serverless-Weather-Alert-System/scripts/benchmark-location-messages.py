@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+LocationQueue message size against the number of recipients at a location.
+Usage: python benchmark-location-messages.py
+
+Builds the messages RecipientsToLocationsFn queues for one location of each
+size in GROUP_SIZES, in each format:
+  per-recipient - one message per recipient carrying its profile (before
+                  locations were grouped)
+  recipients    - SCAN_PROJECTION=full: grouped profiles, split every
+                  MAX_RECIPIENTS_PER_MESSAGE recipients
+  recipientIds  - SCAN_PROJECTION=minimal: grouped contact IDs
+  recipientCount - LOCATION_SOURCE=index: a member count only, members are
+                  read from the location index by WeatherFetchFn
+
+For each it reports the messages queued, the largest message in bytes (SQS
+allows 256 KB) and the queued bytes per recipient. No AWS access needed.
+"""
+
+import json
+
+from synthetic_profiles import load_lambda, wire_items
+
+GROUP_SIZES = (1, 10, 100, 500, 1000, 5000)
+TODAY = '2026-10-17'
+SQS_MAX_BYTES = 256 * 1024
+
+class CapturingPublisher:
+    """Stands in for SqsBatchPublisher, keeping each message body."""
+
+    def __init__(self):
+        self.bodies = []
+
+    def publish(self, body, tag=None):
+        self.bodies.append(json.dumps(body).encode('utf-8'))
+
+def location_group(scanner, size):
+    """Compact profiles of `size` recipients at one location."""
+    locations = {}
+    for item in wire_items(size, locations=1):
+        item.pop('lastAlertedDate', None)
+        scanner.add_to_locations(locations, item, TODAY)
+    [(cell, profiles)] = locations.items()
+    return cell, profiles
+
+def messages(scanner, fmt, cell, profiles):
+    publisher = CapturingPublisher()
+    lat, lon = scanner.cell_center(cell)
+    loc_key = scanner.cell_key(cell)
+    if fmt == 'per-recipient':
+        for values in profiles:
+            publisher.publish({'latitude': lat, 'longitude': lon, 'todayDate': TODAY, **scanner.expand_profile(values)})
+    elif fmt == 'recipients':
+        payload = [scanner.expand_profile(values) for values in profiles]
+        scanner.publish_location(publisher, TODAY, loc_key, lat, lon, 'recipients', payload)
+    elif fmt == 'recipientIds':
+        payload = [values[0] for values in profiles]
+        scanner.publish_location(publisher, TODAY, loc_key, lat, lon, 'recipientIds', payload)
+    else:
+        publisher.publish({
+            'latitude': lat, 'longitude': lon, 'locationKey': loc_key,
+            'todayDate': TODAY, 'recipientCount': len(profiles),
+        })
+    return publisher.bodies
+
+def main():
+    # 1-degree grid cells, so every recipient around the one settlement shares a cell
+    scanner = load_lambda('recipients-to-locations', LOCATION_BUCKETING='grid', LOCATION_RESOLUTION='1')
+    formats = ('per-recipient', 'recipients', 'recipientIds', 'recipientCount')
+    print(f"MAX_RECIPIENTS_PER_MESSAGE={scanner.MAX_RECIPIENTS_PER_MESSAGE}, SQS limit {SQS_MAX_BYTES} bytes\n")
+    print(f"{'recipients':>10}  {'format':<15}{'messages':>9}{'largest (B)':>13}{'B/recipient':>13}")
+    for size in GROUP_SIZES:
+        cell, profiles = location_group(scanner, size)
+        assert len(profiles) == size
+        for fmt in formats:
+            bodies = messages(scanner, fmt, cell, profiles)
+            largest = max(map(len, bodies))
+            flag = '  over SQS limit' if largest > SQS_MAX_BYTES else ''
+            print(f"{size:>10}  {fmt:<15}{len(bodies):>9}{largest:>13}{sum(map(len, bodies)) / size:>13.1f}{flag}")
+        print()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Items per second of the scan hot loop: Decimal deserialization vs wire-format parsing.
+Usage: python benchmark-scan-parsing.py [<items>]
+Example: python benchmark-scan-parsing.py 200000
+
+Runs the same synthetic scan items (DynamoDB wire format) through:
+  decimal - what the Table resource did: TypeDeserializer turns each item
+            into Python values with Decimal numbers, then float_safe converts
+            latitude and longitude
+  wire    - RecipientsToLocationsFn's add_to_locations on the low-level
+            client's items: wire_float parses numbers straight to float and
+            wire_value reads the profile fields
+
+Both group into the same cells, so only the per-item parsing differs. Each mode
+runs REPEATS times and the best run is reported. No AWS access needed.
+"""
+
+import sys
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from synthetic_profiles import load_lambda, wire_items
+
+DEFAULT_ITEMS = 200000
+REPEATS = 3
+TODAY = '2026-10-17'
+
+def float_safe(val):
+    """Convert Decimal or numeric types to float safely (the Table resource scan loop's helper)."""
+    if isinstance(val, Decimal):
+        return float(val)
+    if isinstance(val, (float, int)):
+        return float(val)
+    try:
+        return float(val)
+    except Exception:
+        return None
+
+def group_decimal(scanner, items):
+    deserialize = TypeDeserializer().deserialize
+    fields = scanner.RECIPIENT_FIELDS
+    locations = {}
+    for wire in items:
+        item = {name: deserialize(value) for name, value in wire.items()}
+        lat = float_safe(item.get('latitude'))
+        lon = float_safe(item.get('longitude'))
+        if lat is None or lon is None or (lat == 0.0 and lon == 0.0):
+            continue
+        if item.get('lastAlertedDate') == TODAY:
+            continue
+        locations.setdefault(scanner.location_cell(lat, lon), []).append(
+            tuple(item.get(field) for field in fields)
+        )
+    return locations
+
+def group_wire(scanner, items):
+    locations = {}
+    for item in items:
+        scanner.add_to_locations(locations, item, TODAY)
+    return locations
+
+def best_rate(group, scanner, items):
+    best = None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        locations = group(scanner, items)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best, locations
+
+def main(count):
+    scanner = load_lambda('recipients-to-locations', LOCATION_BUCKETING='round')
+    items = list(wire_items(count))
+    print(f"Parsing {count} synthetic scan items, best of {REPEATS}\n")
+
+    decimal_rate, decimal_cells = best_rate(group_decimal, scanner, items)
+    wire_rate, wire_cells = best_rate(group_wire, scanner, items)
+    if decimal_cells.keys() != wire_cells.keys():
+        raise SystemExit("The two modes grouped items into different cells")
+
+    print(f"{'mode':<10}{'items/s':>12}{'us/item':>10}")
+    for mode, rate in (('decimal', decimal_rate), ('wire', wire_rate)):
+        print(f"{mode:<10}{rate:>12.0f}{1e6 / rate:>10.2f}")
+    print(f"\nwire: {wire_rate / decimal_rate:.1f}x the items per second of the Decimal path")
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and not sys.argv[1].isdigit()):
+        print("Usage: python benchmark-scan-parsing.py [<items>]")
+        sys.exit(1)
+    main(int(sys.argv[1]) if len(sys.argv) == 2 else DEFAULT_ITEMS)
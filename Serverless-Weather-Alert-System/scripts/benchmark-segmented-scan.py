@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+RecipientsToLocationsFn's table scan, sequential vs segmented, against a local
+stand-in for MumBaseTable.
+Usage: python benchmark-segmented-scan.py [<rows>] [<page-latency-ms>]
+Example: python benchmark-segmented-scan.py 1000000 80
+
+The stand-in holds <rows> synthetic profiles as JSON and answers Scan calls
+the way DynamoDB does: pages of up to 1 MB, a LastEvaluatedKey to resume
+from, and Segment/TotalSegments splitting the table into disjoint parts.
+Each page waits <page-latency-ms> (the service's read and round trip) and is
+then parsed with json.loads on the calling thread, as botocore does.
+
+The Lambda's own scan_segment and read_parts run on top of it for each count
+in SEGMENTS, and every run must group the same recipients into the same cells.
+No AWS access needed.
+"""
+
+import sys
+import os
+import json
+import time
+
+from synthetic_profiles import load_lambda, wire_items
+
+DEFAULT_ROWS = 1000000
+DEFAULT_PAGE_LATENCY_MS = 80
+SEGMENTS = (1, 2, 4, 8, 16)
+PAGE_BYTES = 1024 * 1024
+TODAY = '2026-10-17'
+
+class ScanStandIn:
+    """In-memory MumBaseTable answering the low-level client's scan()."""
+
+    def __init__(self, rows, page_latency):
+        self.rows = rows
+        self.page_latency = page_latency
+
+    def scan(self, TableName, Segment=0, TotalSegments=1, ExclusiveStartKey=None, **kwargs):
+        # Segment s holds rows s, s + TotalSegments, s + 2 * TotalSegments, ...
+        position = int(ExclusiveStartKey['row']['N']) + TotalSegments if ExclusiveStartKey else Segment
+        page = []
+        size = 0
+        while position < len(self.rows) and size < PAGE_BYTES:
+            page.append(self.rows[position])
+            size += len(self.rows[position])
+            position += TotalSegments
+
+        time.sleep(self.page_latency)  # nosemgrep: arbitrary-sleep
+        response = {'Items': json.loads(b'[' + b','.join(page) + b']')}
+        if position < len(self.rows):
+            response['LastEvaluatedKey'] = {'row': {'N': str(position - TotalSegments)}}
+        return response
+
+def scan_all(scanner, total_segments):
+    """One full scan through the Lambda's reader; returns items read and location groups."""
+    def reader(segment, start_key, should_stop):
+        return scanner.scan_segment(TODAY, segment, total_segments, start_key, should_stop)
+
+    scanned, locations, remaining = scanner.read_parts(reader, list(range(total_segments)), {}, None)
+    assert not remaining
+    return scanned, locations
+
+def main(rows, page_latency_ms):
+    scanner = load_lambda('recipients-to-locations', LOCATION_BUCKETING='round')
+    print(f"Generating {rows} synthetic profiles...")
+    table = [json.dumps(item, separators=(',', ':')).encode() for item in wire_items(rows)]
+    pages = -(-sum(map(len, table)) // PAGE_BYTES)
+    scanner.dynamodb_client = ScanStandIn(table, page_latency_ms / 1000)
+
+    print(f"About {pages} pages of 1 MB, {page_latency_ms} ms per page\n")
+    print(f"{'segments':>8}{'seconds':>10}{'items/s':>12}{'speedup':>9}{'locations':>11}")
+    baseline = None
+    expected = None
+    for total_segments in SEGMENTS:
+        started = time.perf_counter()
+        scanned, locations = scan_all(scanner, total_segments)
+        elapsed = time.perf_counter() - started
+
+        grouped = (len(locations), sum(len(members) for members in locations.values()))
+        if expected is None:
+            expected = grouped
+        elif grouped != expected:
+            raise SystemExit(f"{total_segments} segments grouped {grouped}, expected {expected}")
+        baseline = baseline or elapsed
+        print(f"{total_segments:>8}{elapsed:>10.1f}{scanned / elapsed:>12.0f}"
+              f"{baseline / elapsed:>8.1f}x{len(locations):>11}")
+        del locations
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) > 2 or not all(arg.isdigit() for arg in args):
+        print("Usage: python benchmark-segmented-scan.py [<rows>] [<page-latency-ms>]")
+        sys.exit(1)
+    main(
+        int(args[0]) if args else DEFAULT_ROWS,
+        int(args[1]) if len(args) > 1 else DEFAULT_PAGE_LATENCY_MS,
+    )
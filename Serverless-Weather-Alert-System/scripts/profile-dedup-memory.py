@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Peak RSS of RecipientsToLocationsFn's location grouping on synthetic profiles.
+Usage: python profile-dedup-memory.py [<rows>] [<locations>]
+Example: python profile-dedup-memory.py 1000000 50000
+
+Compares two ways of holding the scan's dedup state in memory:
+  strings - formatted "lat,lon" string keys, each recipient kept as a dict
+  cells   - packed integer cell IDs, each recipient kept as a tuple
+            (add_to_locations, as the Lambda runs today)
+
+Each mode runs in its own process so one does not inflate the other's peak.
+Profiles are generated page by page and dropped after grouping, as a scan would.
+"""
+
+import sys
+import os
+import time
+import resource
+import subprocess
+
+from synthetic_profiles import load_lambda, pages, wire_items
+
+DEFAULT_ROWS = 1000000
+DEFAULT_LOCATIONS = 50000
+TODAY = '2026-10-17'
+MODES = ('strings', 'cells')
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def group_strings(scanner, locations, item):
+    lat = scanner.wire_float(item.get('latitude'))
+    lon = scanner.wire_float(item.get('longitude'))
+    if lat is None or lon is None or (lat == 0.0 and lon == 0.0):
+        return
+    if scanner.wire_value(item.get('lastAlertedDate')) == TODAY:
+        return
+    loc_key = f"{round(lat, 3)},{round(lon, 3)}"
+    profile = {field: scanner.wire_value(item.get(field)) for field in scanner.RECIPIENT_FIELDS}
+    locations.setdefault(loc_key, []).append(
+        {field: value for field, value in profile.items() if value is not None}
+    )
+
+def group_cells(scanner, locations, item):
+    scanner.add_to_locations(locations, item, TODAY)
+
+def run_mode(mode, rows, location_count):
+    """Group `rows` profiles in this process and print one result line."""
+    scanner = load_lambda('recipients-to-locations', LOCATION_BUCKETING='round')
+    group = group_strings if mode == 'strings' else group_cells
+    before = peak_rss_mb()
+
+    locations = {}
+    started = time.perf_counter()
+    for page in pages(wire_items(rows, location_count)):
+        for item in page:
+            group(scanner, locations, item)
+    elapsed = time.perf_counter() - started
+
+    recipients = sum(len(members) for members in locations.values())
+    print(f"{mode}\t{peak_rss_mb() - before:.1f}\t{len(locations)}\t{recipients}\t{elapsed:.1f}")
+
+def compare(rows, location_count):
+    print(f"Grouping {rows} synthetic profiles around {location_count} settlements\n")
+    print(f"{'mode':<10}{'peak RSS (MB)':>15}{'locations':>12}{'recipients':>12}{'seconds':>10}")
+    results = {}
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--mode', mode, str(rows), str(location_count)],
+            check=True, capture_output=True, text=True,
+        ).stdout.split()
+        results[mode] = float(output[1])
+        print(f"{mode:<10}{output[1]:>15}{output[2]:>12}{output[3]:>12}{output[4]:>10}")
+
+    saved = 1 - results['cells'] / results['strings']
+    print(f"\nPeak RSS above the imported Lambda: {saved:.0%} lower with integer cells and tuples")
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args[:1] == ['--mode'] and len(args) == 4 and args[1] in MODES:
+        run_mode(args[1], int(args[2]), int(args[3]))
+    elif len(args) <= 2 and all(arg.isdigit() for arg in args):
+        compare(
+            int(args[0]) if args else DEFAULT_ROWS,
+            int(args[1]) if len(args) > 1 else DEFAULT_LOCATIONS,
+        )
+    else:
+        print("Usage: python profile-dedup-memory.py [<rows>] [<locations>]")
+        sys.exit(1)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Feed MumBaseTable stream records through the location indexer locally.
+Usage: python replay-stream-events.py <index-table-name> <events.json> [<recipients-table-name>]
+       python replay-stream-events.py <index-table-name> --backfill <recipients-table-name>
+Example: python replay-stream-events.py LocationCellIndex recorded-stream-events.json MumBaseTable
+
+<events.json> holds recorded stream records, either as a Lambda event
+({"Records": [...]}) or a plain list of records. --backfill builds INSERT
+records from every item in the recipients table, which is how an existing
+table is indexed for the first time. The recipients table (default
+MumBaseTable) is where the indexer writes each profile's alertShard and
+nextAlertDate for AlertEligibleIndex.
+
+Set AWS_ENDPOINT_URL_DYNAMODB (e.g. http://localhost:8000) to replay
+against DynamoDB Local instead of AWS.
+"""
+
+import sys
+import os
+import json
+import importlib.util
+import boto3
+
+BATCH_SIZE = 100
+DEFAULT_RECIPIENTS_TABLE = 'MumBaseTable'
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda')
+
+def load_indexer(index_table_name, recipients_table_name):
+    """Import lambda/location-indexer/index.py with the shared layer on the path."""
+    os.environ['LOCATION_INDEX_TABLE_NAME'] = index_table_name
+    os.environ['RECIPIENTS_TABLE_NAME'] = recipients_table_name
+    sys.path.insert(0, os.path.join(LAMBDA_DIR, 'shared', 'python'))
+    spec = importlib.util.spec_from_file_location(
+        'location_indexer', os.path.join(LAMBDA_DIR, 'location-indexer', 'index.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def recorded_records(events_file):
+    """Yield stream records from a recorded events file."""
+    with open(events_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('Records', [])
+    yield from data
+
+def backfill_records(table_name):
+    """Yield synthetic INSERT stream records for every item in the recipients table."""
+    client = boto3.client('dynamodb')
+    paginator = client.get_paginator('scan')
+    sequence = 0
+    for page in paginator.paginate(
+        TableName=table_name,
+        ProjectionExpression='contact_uuid,latitude,longitude,lastAlertedDate,alertShard,nextAlertDate'
+    ):
+        for item in page['Items']:
+            sequence += 1
+            yield {
+                'eventName': 'INSERT',
+                'dynamodb': {
+                    'Keys': {'contact_uuid': item['contact_uuid']},
+                    'NewImage': item,
+                    'SequenceNumber': str(sequence),
+                },
+            }
+
+def replay(indexer, records):
+    """Send records through the indexer handler in stream-sized batches."""
+    total = 0
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == BATCH_SIZE:
+            total += send_batch(indexer, batch)
+            batch = []
+    if batch:
+        total += send_batch(indexer, batch)
+    print(f"\nComplete! Replayed {total} records")
+
+def send_batch(indexer, batch):
+    result = indexer.lambda_handler({'Records': batch}, None)
+    if result['batchItemFailures']:
+        failed = result['batchItemFailures'][0]['itemIdentifier']
+        print(f"Indexer failed at sequence number {failed}, stopping")
+        sys.exit(1)
+    return len(batch)
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[2] == '--backfill':
+        indexer = load_indexer(sys.argv[1], sys.argv[3])
+        replay(indexer, backfill_records(sys.argv[3]))
+    elif len(sys.argv) in (3, 4) and sys.argv[2] != '--backfill':
+        recipients_table_name = sys.argv[3] if len(sys.argv) == 4 else DEFAULT_RECIPIENTS_TABLE
+        indexer = load_indexer(sys.argv[1], recipients_table_name)
+        replay(indexer, recorded_records(sys.argv[2]))
+    else:
+        print("Usage: python replay-stream-events.py <index-table-name> <events.json> [<recipients-table-name>]")
+        print("       python replay-stream-events.py <index-table-name> --backfill <recipients-table-name>")
+        sys.exit(1)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Throughput of SharedRateLimiter against an in-memory stand-in for the RateLimit table.
+Usage: python simulate-rate-limiter.py [<seconds>]
+Example: python simulate-rate-limiter.py 24
+
+Runs LIMITERS limiters (one per simulated WeatherFetchFn container) with
+THREADS_PER_LIMITER fetch threads each, all sharing one provider bucket of
+CALLS_PER_SECOND with a burst of BURST, once per daily quota in QUOTAS.
+For each run it reports the calls allowed and their rate, the conditional
+writes to the token row (taken and lost races) per token, and the writes
+spent on calls refused by the quota.
+
+The stand-in applies the limiter's conditional updates under a lock, with
+TABLE_LATENCY seconds of simulated round trip, so no AWS access is needed.
+"""
+
+import sys
+import os
+import time
+import threading
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'shared', 'python'))
+from rate_limit import SharedRateLimiter, RateLimitExceeded  # noqa: E402
+
+LIMITERS = 4
+THREADS_PER_LIMITER = 2
+CALLS_PER_SECOND = 5
+BURST = 2
+QUOTAS = (0, 60, 20)  # 0 = no daily quota
+TABLE_LATENCY = 0.01
+CALL_SECONDS = 0.05  # Time a provider request takes once allowed
+DEFAULT_SECONDS = 24
+
+class RateLimitTable:
+    """Applies SharedRateLimiter's UpdateItem calls to in-memory rows and counts them."""
+
+    def __init__(self):
+        self.rows = {}
+        self.lock = threading.Lock()
+        self.writes = {'rate': 0, 'rate_failed': 0, 'day': 0, 'day_failed': 0}
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression,
+                    ExpressionAttributeValues, **kwargs):
+        values = {name: float(value['N']) for name, value in ExpressionAttributeValues.items()}
+        key = Key['state_key']['S']
+        kind = 'rate' if key.endswith('#rate') else 'day'
+        time.sleep(TABLE_LATENCY / 2)
+
+        with self.lock:
+            row = self.rows.setdefault(key, {})
+            self.writes[kind] += 1
+            if kind == 'rate':
+                tat = row.get('tat')
+                if ConditionExpression.startswith('attribute_not_exists'):
+                    allowed = tat is None or tat < values[':now']
+                    updated = {'tat': values[':next']}
+                else:
+                    allowed = tat is not None and values[':now'] <= tat <= values[':latest']
+                    updated = {'tat': (tat or 0) + values[':interval']}
+            else:
+                calls = row.get('calls')
+                allowed = calls is None or calls < values[':limit']
+                updated = {'calls': (calls or 0) + 1}
+
+            if not allowed:
+                self.writes[f'{kind}_failed'] += 1
+                old = {name: {'N': repr(value)} for name, value in row.items()}
+                error = ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+                error.response['Item'] = old
+                raise error
+            row.update(updated)
+
+        time.sleep(TABLE_LATENCY / 2)
+        return {'Attributes': {name: {'N': repr(value)} for name, value in updated.items()}}
+
+def simulate(quota, seconds):
+    """Run the fetch threads for `seconds` and return the counters."""
+    table = RateLimitTable()
+    limiters = [
+        SharedRateLimiter(table, 'RateLimit', 'tomorrow.io', CALLS_PER_SECOND,
+                          calls_per_day=quota, burst=BURST)
+        for _ in range(LIMITERS)
+    ]
+    counts = {'allowed': 0, 'refused': 0}
+    lock = threading.Lock()
+    stop_at = time.time() + seconds
+
+    def fetch(limiter):
+        while time.time() < stop_at:
+            try:
+                limiter.acquire()
+                outcome = 'allowed'
+            except RateLimitExceeded:
+                outcome = 'refused'
+            with lock:
+                counts[outcome] += 1
+            time.sleep(CALL_SECONDS)  # nosemgrep: arbitrary-sleep
+
+    threads = [
+        threading.Thread(target=fetch, args=(limiter,))
+        for limiter in limiters for _ in range(THREADS_PER_LIMITER)
+    ]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts, table.writes, time.time() - started
+
+def main(seconds):
+    print(f"{LIMITERS} limiters x {THREADS_PER_LIMITER} threads, {CALLS_PER_SECOND}/s, "
+          f"burst {BURST}, {seconds}s per run\n")
+    print(f"{'quota':>6}{'allowed':>9}{'calls/s':>9}{'refused':>9}"
+          f"{'token writes':>14}{'lost races':>12}{'writes/token':>14}{'writes/refusal':>16}")
+    for quota in QUOTAS:
+        counts, writes, elapsed = simulate(quota, seconds)
+        tokens = writes['rate'] - writes['rate_failed']
+        per_token = writes['rate'] / tokens if tokens else 0
+        # Token and quota writes made after the quota was spent, per refused call
+        wasted = writes['day_failed'] + max(0, tokens - counts['allowed'])
+        per_refusal = f"{wasted / counts['refused']:.2f}" if counts['refused'] else '-'
+        print(f"{quota or '-':>6}{counts['allowed']:>9}{counts['allowed'] / elapsed:>9.2f}{counts['refused']:>9}"
+              f"{writes['rate']:>14}{writes['rate_failed']:>12}{per_token:>14.2f}{per_refusal:>16}")
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and not sys.argv[1].isdigit()):
+        print("Usage: python simulate-rate-limiter.py [<seconds>]")
+        sys.exit(1)
+    main(int(sys.argv[1]) if len(sys.argv) == 2 else DEFAULT_SECONDS)
@@ -0,0 +1,84 @@
+"""
+Synthetic MumBaseTable profiles and Lambda loading shared by the benchmark scripts.
+Profiles are generated deterministically from a seed, in DynamoDB wire format
+(what the low-level client returns), so no AWS account is needed.
+"""
+
+import os
+import sys
+import random
+import importlib.util
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda')
+
+# Environment the Lambda modules need at import time; nothing is sent to AWS
+LAMBDA_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'RECIPIENTS_TABLE_NAME': 'MumBaseTable',
+    'LOCATION_QUEUE_URL': 'https://sqs.us-east-1.amazonaws.com/123456789012/LocationQueue',
+    'WEATHER_RESULT_QUEUE_URL': 'https://sqs.us-east-1.amazonaws.com/123456789012/WeatherResult',
+}
+
+LANGUAGES = ('ENG', 'SWH')
+STAGES = ('ANC', 'PNC')
+CONDITIONS = (None, 'anemia,', 'hypertension,', 'anemia,hypertension,')
+
+def load_lambda(name, **env):
+    """Import lambda/<name>/index.py with the shared layer on the path."""
+    for key, value in {**LAMBDA_ENV, **env}.items():
+        os.environ.setdefault(key, str(value))
+    for path in (os.path.join(LAMBDA_DIR, 'shared', 'python'), os.path.join(LAMBDA_DIR, name)):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(
+        name.replace('-', '_'), os.path.join(LAMBDA_DIR, name, 'index.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def location_centres(count, seed=1):
+    """`count` settlement centres spread over Kenya."""
+    rng = random.Random(seed)
+    return [(rng.uniform(-4.5, 4.5), rng.uniform(34.0, 41.5)) for _ in range(count)]
+
+def coordinates(count, locations=50000, spread=0.0005, seed=1):
+    """Yield `count` (lat, lon) pairs clustered around `locations` centres."""
+    rng = random.Random(seed)
+    centres = location_centres(locations, seed)
+    for _ in range(count):
+        lat, lon = centres[rng.randrange(locations)]
+        yield lat + rng.gauss(0, spread), lon + rng.gauss(0, spread)
+
+def wire_items(count, locations=50000, seed=1):
+    """Yield `count` wire-format profiles with the fields the scanner projects."""
+    rng = random.Random(seed)
+    for n, (lat, lon) in enumerate(coordinates(count, locations, seed=seed)):
+        item = {
+            'contact_uuid': {'S': '%032x' % rng.getrandbits(128)},
+            'latitude': {'N': f'{lat:.6f}'},
+            'longitude': {'N': f'{lon:.6f}'},
+            'language': {'S': LANGUAGES[n % 2]},
+            'anc_pnc_value': {'S': STAGES[n % 3 == 0]},
+            'status': {'S': 'active'},
+            'facility_code': {'N': str(10000 + n % 900)},
+            'facility_name': {'S': f'Health Centre {n % 900}'},
+            'phone_number': {'S': f'+2547{rng.randrange(10 ** 8):08d}'},
+        }
+        condition = CONDITIONS[n % len(CONDITIONS)]
+        if condition:
+            item['medical_conditions'] = {'S': condition}
+        if n % 5 == 0:
+            item['lastAlertedDate'] = {'S': '2026-10-16'}
+        yield item
+
+def pages(items, page_size=1000):
+    """Group items into scan-sized pages."""
+    page = []
+    for item in items:
+        page.append(item)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
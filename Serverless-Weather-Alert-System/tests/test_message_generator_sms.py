@@ -0,0 +1,118 @@
+"""
+SMS length handling of MessageGeneratorFn's streamed advice, against a stub
+Bedrock response stream (no AWS calls).
+
+Run from the project root: python -m pytest tests
+"""
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lambda", "shared", "python"))
+
+
+class StubStream:
+    """A response stream that yields `text` as content deltas of `chunk_size` characters."""
+
+    def __init__(self, text, chunk_size=20):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        yield {"chunk": {"bytes": json.dumps({"type": "message_start"}).encode()}}
+        for start in range(0, len(self.text), self.chunk_size):
+            self.read = start + self.chunk_size
+            delta = {"type": "content_block_delta", "delta": {"text": self.text[start:self.read]}}
+            yield {"chunk": {"bytes": json.dumps(delta).encode()}}
+
+    def close(self):
+        self.closed = True
+
+
+class StubBedrock:
+    def __init__(self, text):
+        self.stream = StubStream(text)
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        return {"body": self.stream}
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    """A freshly imported MessageGeneratorFn streaming within two SMS segments."""
+    for name, value in {
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "NOTIFY_QUEUE_URL": "https://sqs.us-east-1.amazonaws.com/123456789012/Notify",
+        "BEDROCK_KNOWLEDGE_BASE_ID": "kb",
+        "BEDROCK_MODEL_ID": "model",
+        "STREAM_ADVICE": "true",
+        "SMS_MAX_SEGMENTS": "2",
+        "KB_CACHE_WARMUP": "false",
+    }.items():
+        monkeypatch.setenv(name, value)
+    for name in ("ADVICE_MAX_CHARS", "CACHE_TABLE_NAME"):
+        monkeypatch.delenv(name, raising=False)
+
+    spec = importlib.util.spec_from_file_location(
+        "message_generator_index", os.path.join(ROOT, "lambda", "message-generator", "index.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# A cohort template longer than the 306-character budget whose last sentence,
+# holding the placeholder, is cut off by the budget
+TEMPLATE = (
+    "Mama, kunywa maji mengi leo na ukae kivulini wakati wa mchana. "
+    "Vaa nguo nyepesi na epuka kazi nzito saa sita hadi saa kumi. "
+    "Ukihisi kizunguzungu au maumivu ya kichwa, nenda kliniki mara moja. "
+    "Pumzika mara kwa mara na ule matunda yenye maji. "
+    "Kesho joto ni {temperature}, kwa hiyo panga safari zako asubuhi na mapema sana "
+    "na ubebe chupa ya maji popote uendapo ili usipate kiu njiani."
+)
+
+
+def test_stream_closed_early_ends_on_a_full_sentence(generator):
+    bedrock = StubBedrock(TEMPLATE)
+    generator.bedrock = bedrock
+
+    advice = generator.stream_claude("prompt", "model")
+
+    assert bedrock.stream.closed
+    assert bedrock.stream.read < len(TEMPLATE)  # The rest of the completion was never read
+    assert advice.endswith("matunda yenye maji.")
+    assert "{temperature" not in advice
+
+    # Filling in the temperature shortens the text, and it still ends on a full sentence
+    message = generator.fit_sms(generator.fill_template(advice, "32.5"))
+    assert message == advice
+    assert len(message) <= 306
+
+
+def test_filled_template_keeps_the_placeholder_sentence_when_it_fits(generator):
+    short = "Kunywa maji mengi. Kesho joto ni {temperature}, kaa kivulini."
+    generator.bedrock = StubBedrock(short)
+
+    advice = generator.stream_claude("prompt", "model")
+
+    assert advice == short
+    assert generator.fit_sms(generator.fill_template(advice, "32.5")) == (
+        "Kunywa maji mengi. Kesho joto ni 32.5C, kaa kivulini."
+    )
+
+
+def test_non_gsm_text_gets_the_ucs2_budget(generator):
+    text = "Kaa kivulini leo. " * 10 + "Joto ni 33°C."
+
+    message = generator.fit_sms(text)
+
+    assert len(message) <= 134  # Two UCS-2 segments of 67 characters
+    assert message.endswith(".")
+    assert generator.fit_sms("Kaa kivulini leo. " * 10) == "Kaa kivulini leo. " * 10
@@ -0,0 +1,60 @@
+"""
+Daily quota handling of SharedRateLimiter, against a stub DynamoDB client
+(no AWS calls).
+
+Run from the project root: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+from botocore.exceptions import ClientError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lambda", "shared", "python"))
+
+from rate_limit import RateLimitExceeded, SharedRateLimiter  # noqa: E402
+
+
+class StubDynamoDB:
+    """Grants every token and counts quota calls up to `quota`."""
+
+    def __init__(self, quota):
+        self.quota = quota
+        self.calls = 0
+        self.writes = []
+
+    def update_item(self, Key, **kwargs):
+        row = Key["state_key"]["S"]
+        self.writes.append(row)
+        if row.endswith("#rate"):
+            return {"Attributes": {"tat": {"N": kwargs["ExpressionAttributeValues"][":next"]["N"]}}}
+        if self.calls >= self.quota:
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+        self.calls += 1
+        return {}
+
+
+def test_spent_quota_is_refused_without_further_writes():
+    dynamodb = StubDynamoDB(quota=1)
+    limiter = SharedRateLimiter(dynamodb, "RateLimit", "stub", calls_per_second=1000, calls_per_day=1)
+
+    limiter.acquire()
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+    writes = len(dynamodb.writes)
+
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+    assert len(dynamodb.writes) == writes  # Refused in-process: no token taken, no quota write
+
+
+def test_spent_quota_is_checked_again_the_next_day(monkeypatch):
+    dynamodb = StubDynamoDB(quota=0)
+    limiter = SharedRateLimiter(dynamodb, "RateLimit", "stub", calls_per_second=1000, calls_per_day=1)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+
+    monkeypatch.setattr(SharedRateLimiter, "_today", staticmethod(lambda: "2099-01-01"))
+    dynamodb.quota = 1
+    limiter.acquire()
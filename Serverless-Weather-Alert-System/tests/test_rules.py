@@ -0,0 +1,109 @@
+"""
+Alert rule parsing and evaluation of WeatherFetchFn (rules.py).
+
+Run from the project root: python -m pytest tests
+"""
+import math
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lambda", "weather-fetch"))
+
+from rules import Rule, RuleError, RuleSet, load_rules  # noqa: E402
+
+
+def test_and_binds_tighter_than_or():
+    rule = Rule("temperature >= 32 OR rainfall > 10 AND wind_speed > 20")
+
+    assert rule.matches({"temperatureMax": 33})
+    assert not rule.matches({"rainAccumulationSum": 20, "windSpeedMax": 5})
+    assert rule.matches({"rainAccumulationSum": 20, "windSpeedMax": 25})
+
+
+def test_parentheses_override_precedence():
+    rule = Rule("(temperature >= 32 OR rainfall > 10) AND wind_speed > 20")
+
+    assert not rule.matches({"temperatureMax": 33, "windSpeedMax": 5})
+    assert rule.matches({"rainAccumulationSum": 20, "windSpeedMax": 25})
+
+
+def test_not_applies_to_the_next_factor_only():
+    rule = Rule("NOT rainfall > 5 AND temperature >= 32")
+
+    assert rule.matches({"rainAccumulationSum": 1, "temperatureMax": 33})
+    assert not rule.matches({"rainAccumulationSum": 1, "temperatureMax": 30})
+    assert not rule.matches({"rainAccumulationSum": 9, "temperatureMax": 33})
+    assert Rule("NOT (rainfall > 5 AND temperature >= 32)").matches({"rainAccumulationSum": 1, "temperatureMax": 30})
+
+
+@pytest.mark.parametrize("daily", [{}, {"temperatureMax": None}, {"temperatureMax": math.nan}])
+def test_missing_or_nan_values_never_satisfy_a_comparison(daily):
+    assert not Rule("temperature >= 32").matches(daily)
+    assert not Rule("temperature < 32").matches(daily)
+    assert not Rule("temperature != 32").matches(daily)
+    # ...so NOT of a comparison on a missing value is true
+    assert Rule("NOT temperature >= 32").matches(daily)
+
+
+def test_numeric_strings_are_compared_as_numbers():
+    assert Rule("temperature >= 32").matches({"temperatureMax": "32.5"})
+
+
+@pytest.mark.parametrize("text", ["temperature >=", "temperature >= 32 AND", "(temperature >= 32", "temperature ~ 3"])
+def test_invalid_rules_are_rejected(text):
+    with pytest.raises(RuleError):
+        Rule(text)
+
+
+def test_segments_fall_back_to_the_default_rule():
+    rules = RuleSet({"default": "temperature >= 32", "ANC": "temperature >= 30"}, "anc_pnc_value")
+
+    assert rules.segment_of({"anc_pnc_value": "anc"}) == "ANC"
+    assert rules.segment_of({"anc_pnc_value": "PNC"}) == "DEFAULT"
+    assert rules.segment_of({}) == "DEFAULT"
+    assert rules.evaluate_many([{"temperatureMax": 31}]) == [{"DEFAULT": False, "ANC": True}]
+
+
+def test_segment_field_unset_uses_the_default_rule_for_everyone():
+    rules = RuleSet({"default": "temperature >= 32", "ANC": "temperature >= 30"})
+
+    assert rules.segment_of({"anc_pnc_value": "ANC"}) == "DEFAULT"
+
+
+def test_a_default_rule_is_required():
+    with pytest.raises(RuleError):
+        RuleSet({"ANC": "temperature >= 30"})
+
+
+def test_single_threshold_is_used_without_alert_rules():
+    rules = load_rules(None, "anc_pnc_value", "temperatureMax", "gte", 32)
+
+    assert rules.fields == {"temperatureMax"}
+    assert rules.default.matches({"temperatureMax": 32})
+    assert not rules.default.matches({"temperatureMax": 31.9})
+
+
+def test_evaluate_many_agrees_with_per_record_evaluation():
+    rules = RuleSet({
+        "default": "temperature >= 32 AND (rainfall < 5 OR wind_speed >= 11)",
+        "ANC": "temperature >= 30 OR NOT humidity < 80",
+    })
+    values = [None, math.nan, 0, 4.9, 5, 11, 29.5, 30, 32, 35, 90]
+    rng = random.Random(17)
+    forecasts = [None, {}]
+    for _ in range(500):
+        daily = {}
+        for field in ("temperatureMax", "rainAccumulationSum", "windSpeedMax", "humidityMax"):
+            if rng.random() < 0.8:
+                daily[field] = rng.choice(values)
+        forecasts.append(daily)
+
+    decisions = rules.evaluate_many(forecasts)
+
+    assert decisions[:2] == [{"DEFAULT": False, "ANC": False}] * 2  # No forecast never matches
+    for daily, decision in zip(forecasts[2:], decisions[2:]):
+        assert decision == {segment: rule.matches(daily) for segment, rule in rules.rules.items()}
@@ -0,0 +1,131 @@
+"""
+Tomorrow.io requests and parsing of WeatherFetchFn, against fixtures laid out
+like the v4 API responses (no network calls):
+
+  fixtures/tomorrow_io_forecast.json        - full forecast API response
+                                              (minutely, hourly and daily timelines)
+  fixtures/tomorrow_io_timelines_slim.json  - slim Timelines API response for
+                                              fields=humidityMax,temperatureMax
+
+Run from the project root: python -m pytest tests
+"""
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+sys.path[:0] = [
+    os.path.join(ROOT, "lambda", "weather-fetch"),
+    os.path.join(ROOT, "lambda", "shared", "python"),
+]
+
+from providers.tomorrow_io import TomorrowIoProvider  # noqa: E402
+
+
+def fixture_bytes(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+class StubResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+    def raise_for_status(self):
+        pass
+
+
+class StubSession:
+    """Answers every GET with one recorded body and keeps the requests made."""
+
+    def __init__(self, body):
+        self.body = body
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        self.requests.append((url, params))
+        return StubResponse(self.body)
+
+
+def test_slim_forecast_requests_only_the_rule_fields_for_today():
+    session = StubSession(fixture_bytes("tomorrow_io_timelines_slim.json"))
+    provider = TomorrowIoProvider("key", session, fields={"temperatureMax", "humidityMax"})
+
+    daily = provider.get_forecast(-1.286, 36.817)
+
+    assert daily == {"humidityMax": 89, "temperatureMax": 33.4}
+    [(url, params)] = session.requests
+    assert url == TomorrowIoProvider.timelines_url
+    assert params["fields"] == "humidityMax,temperatureMax"
+    assert params["timesteps"] == "1d"
+    assert (params["startTime"], params["endTime"]) == ("now", "nowPlus1d")
+    assert params["location"] == "-1.286,36.817"
+
+
+def test_full_forecast_reads_todays_daily_values():
+    session = StubSession(fixture_bytes("tomorrow_io_forecast.json"))
+    provider = TomorrowIoProvider("key", session)
+
+    daily = provider.get_forecast(-1.286, 36.817)
+
+    assert daily["temperatureMax"] == 33.4
+    assert "humidityMax" in daily and "sunriseTime" in daily
+    [(url, params)] = session.requests
+    assert url == TomorrowIoProvider.url
+    assert "fields" not in params
+
+
+def test_slim_response_is_a_small_fraction_of_the_full_one():
+    full = fixture_bytes("tomorrow_io_forecast.json")
+    slim = fixture_bytes("tomorrow_io_timelines_slim.json")
+
+    assert len(slim) * 100 < len(full)
+    # Both carry the same value for today
+    full_today = json.loads(full)["timelines"]["daily"][0]["values"]
+    slim_today = json.loads(slim)["data"]["timelines"][0]["intervals"][0]["values"]
+    assert slim_today["temperatureMax"] == full_today["temperatureMax"]
+
+
+@pytest.fixture
+def weather_fetch(monkeypatch):
+    """A freshly imported WeatherFetchFn with slim forecasts and a two-field rule."""
+    for name, value in {
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "WEATHER_RESULT_QUEUE_URL": "https://sqs.us-east-1.amazonaws.com/123456789012/WeatherResult",
+        "TOMORROW_IO_API_KEY": "test",
+        "WEATHER_PROVIDER": "tomorrow.io",
+        "SLIM_FORECAST": "true",
+        "ALERT_RULES": "temperature >= 32 AND humidity >= 60",
+        "MAX_CALLS_PER_SECOND": "0",
+    }.items():
+        monkeypatch.setenv(name, value)
+    for name in ("RATE_LIMIT_TABLE_NAME", "CACHE_TABLE_NAME", "HOURLY_RULE"):
+        monkeypatch.delenv(name, raising=False)
+
+    spec = importlib.util.spec_from_file_location(
+        "weather_fetch_index", os.path.join(ROOT, "lambda", "weather-fetch", "index.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_weather_fetch_sends_the_fields_its_rules_use(weather_fetch):
+    session = StubSession(fixture_bytes("tomorrow_io_timelines_slim.json"))
+    weather_fetch.provider.session = session
+
+    daily = weather_fetch.provider.get_forecast(-1.286, 36.817)
+
+    [(_, params)] = session.requests
+    assert params["fields"] == "humidityMax,temperatureMax"
+    assert weather_fetch.alert_rules.default.matches(daily)
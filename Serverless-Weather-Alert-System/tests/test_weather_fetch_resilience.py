@@ -0,0 +1,229 @@
+"""
+Circuit breaker, Retry-After and partial batch handling of WeatherFetchFn,
+against a stub HTTP session and stub SQS client (no AWS calls).
+
+Run from the project root: python -m pytest tests
+"""
+import importlib.util
+import json
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [
+    os.path.join(ROOT, "lambda", "weather-fetch"),
+    os.path.join(ROOT, "lambda", "shared", "python"),
+]
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError  # noqa: E402
+from providers.base import ProviderUnavailable, WeatherProvider  # noqa: E402
+
+
+class StubResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body or {}
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class StubSession:
+    """Answers GETs from a list of responses, repeating the last one."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+
+class StubSqs:
+    def __init__(self):
+        self.sent = []
+        self.visibility = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.sent.extend(json.loads(entry["MessageBody"]) for entry in Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self.visibility.append((QueueUrl, Entries))
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock.time)
+    monkeypatch.setattr(time, "sleep", clock.sleep)
+    return clock
+
+
+def make_provider(session, breaker):
+    provider = WeatherProvider(session)
+    provider.circuit_breaker = breaker
+    return provider
+
+
+def test_breaker_opens_at_threshold_and_fails_fast(clock):
+    breaker = CircuitBreaker(None, None, "stub", failure_threshold=3, open_seconds=30)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.check()
+
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.check()
+    assert error.value.retry_in == pytest.approx(30)
+
+
+def test_failed_probe_reopens_for_longer_and_success_closes(clock):
+    breaker = CircuitBreaker(None, None, "stub", failure_threshold=1, open_seconds=30)
+    breaker.record_failure()
+
+    clock.now += 31
+    breaker.check()  # Probe allowed
+    breaker.record_failure()
+    assert breaker.retry_in() == pytest.approx(60)
+
+    clock.now += 61
+    breaker.check()
+    breaker.record_success()
+    breaker.record_failure()  # Counting starts again from zero...
+    assert breaker.retry_in() == pytest.approx(30)  # ...and the open time is back to the base
+
+
+def test_open_circuit_makes_no_request(clock):
+    breaker = CircuitBreaker(None, None, "stub", failure_threshold=1)
+    breaker.record_failure()
+    session = StubSession(StubResponse(200))
+
+    with pytest.raises(CircuitOpenError):
+        make_provider(session, breaker)._get_json("https://example.test", {})
+    assert session.calls == 0
+
+
+def test_short_retry_after_is_waited_out(clock):
+    breaker = CircuitBreaker(None, None, "stub", failure_threshold=5)
+    session = StubSession(
+        StubResponse(429, headers={"Retry-After": "2"}),
+        StubResponse(200, {"ok": True}),
+    )
+
+    assert make_provider(session, breaker)._get_json("https://example.test", {}) == {"ok": True}
+    assert clock.sleeps == [2]
+    assert breaker.retry_in() == 0  # The success reset the failure count
+
+
+def test_long_retry_after_opens_the_circuit(clock):
+    breaker = CircuitBreaker(None, None, "stub", failure_threshold=5)
+    session = StubSession(StubResponse(503, headers={"Retry-After": "120"}))
+
+    with pytest.raises(ProviderUnavailable) as error:
+        make_provider(session, breaker)._get_json("https://example.test", {})
+    assert error.value.retry_after == 120
+    assert session.calls == 1
+    assert clock.sleeps == []
+    assert breaker.retry_in() == pytest.approx(120)
+
+
+def test_retry_after_is_capped_at_max_open_seconds(clock):
+    breaker = CircuitBreaker(None, None, "stub", max_open_seconds=900)
+    breaker.record_failure(retry_after=6 * 3600)  # e.g. a daily quota resetting in hours
+
+    assert breaker.retry_in() == pytest.approx(900)
+
+
+@pytest.fixture
+def weather_fetch(monkeypatch, clock):
+    """A freshly imported WeatherFetchFn with stub SQS and provider session."""
+    for name, value in {
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "WEATHER_RESULT_QUEUE_URL": "https://sqs.us-east-1.amazonaws.com/123456789012/WeatherResult",
+        "TOMORROW_IO_API_KEY": "test",
+        "DEMO_MODE": "true",
+        "MAX_CALLS_PER_SECOND": "0",
+    }.items():
+        monkeypatch.setenv(name, value)
+    for name in ("RATE_LIMIT_TABLE_NAME", "CACHE_TABLE_NAME", "RECIPIENTS_TABLE_NAME"):
+        monkeypatch.delenv(name, raising=False)
+
+    spec = importlib.util.spec_from_file_location(
+        "weather_fetch_index", os.path.join(ROOT, "lambda", "weather-fetch", "index.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.sqs = StubSqs()
+    return module
+
+
+def location_record(message_id, lat, lon, contacts):
+    return {
+        "messageId": message_id,
+        "receiptHandle": f"handle-{message_id}",
+        "eventSourceARN": "arn:aws:sqs:us-east-1:123456789012:LocationQueue",
+        "attributes": {"ApproximateReceiveCount": "1"},
+        "body": json.dumps({
+            "latitude": lat,
+            "longitude": lon,
+            "todayDate": "2026-10-17",
+            "recipients": [{"contact_uuid": contact} for contact in contacts],
+        }),
+    }
+
+
+def test_handler_fails_only_unfetched_records_and_delays_them(weather_fetch):
+    cached = location_record("m-cached", -1.28, 36.82, ["a", "b"])
+    unavailable = location_record("m-down", 0.52, 35.27, ["c"])
+
+    # One location is served from the forecast cache; the provider is down for the other
+    weather_fetch.forecast_cache.put(
+        weather_fetch.forecast_cache_key(json.loads(cached["body"])), {"temperatureMax": 34}
+    )
+    weather_fetch.provider.session = StubSession(StubResponse(503, headers={"Retry-After": "60"}))
+
+    result = weather_fetch.lambda_handler({"Records": [cached, unavailable]}, None)
+
+    assert result["batchItemFailures"] == [{"itemIdentifier": "m-down"}]
+    assert sorted(msg["contact_uuid"] for msg in weather_fetch.sqs.sent) == ["a", "b"]
+
+    # The failed record stays invisible until the circuit closes
+    [(queue_url, entries)] = weather_fetch.sqs.visibility
+    assert queue_url == "https://sqs.us-east-1.amazonaws.com/123456789012/LocationQueue"
+    assert [entry["ReceiptHandle"] for entry in entries] == ["handle-m-down"]
+    assert entries[0]["VisibilityTimeout"] == 61
+
+
+def test_redelivery_delay_is_capped_at_the_sqs_maximum(weather_fetch):
+    weather_fetch.provider.circuit_breaker.max_open_seconds = 86400
+    weather_fetch.provider.session = StubSession(StubResponse(429, headers={"Retry-After": "86400"}))
+
+    result = weather_fetch.lambda_handler({"Records": [location_record("m-quota", 0.52, 35.27, ["c"])]}, None)
+
+    assert result["batchItemFailures"] == [{"itemIdentifier": "m-quota"}]
+    [(_, entries)] = weather_fetch.sqs.visibility
+    assert entries[0]["VisibilityTimeout"] == 43200